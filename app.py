@@ -1,11 +1,35 @@
+import os
+import sys
+import asyncio
+import plotly
 from fastapi import FastAPI
+from fastapi.responses import FileResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from backend.router import router  
 import uvicorn
 
+# psycopg's async connections (DBConnection.fetch_df) need a selector event loop on Windows
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
 app = FastAPI()
 
+# Serve the plotly.js bundle shipped with the plotly package once, with long-lived caching (the graph endpoints
+# return figure JSON and the pages load this file). Registered before the /static mount so it takes precedence.
+# The cached URL carries the plotly version: the pages load /static/js/plotly.min.js, which is revalidated on every
+# load and redirects to the bundle of the installed version, so an upgrade is never served from an old cached bundle.
+PLOTLY_JS_PATH = os.path.join(os.path.dirname(plotly.__file__), "package_data", "plotly.min.js")
+PLOTLY_JS_URL = f"/static/js/plotly-{plotly.__version__}.min.js"
+
+@app.get("/static/js/plotly.min.js", include_in_schema=False)
+async def plotly_js_latest():
+    return RedirectResponse(PLOTLY_JS_URL, headers={"Cache-Control": "no-cache"})
+
+@app.get(PLOTLY_JS_URL, include_in_schema=False)
+async def plotly_js():
+    return FileResponse(PLOTLY_JS_PATH, media_type="text/javascript", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
 # Serve frontend from the /frontend path (e.g., http://localhost:8000/static/index.html)
 app.mount("/static", StaticFiles(directory="static", html=True), name="static")
 
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from backend.classes.graphs import TraceData
+from backend.classes.filter_data import ReadableDataFormatter
+from backend.classes.regression import LeastSquaresPolynomial
 
 class Calculation:
     """
@@ -168,6 +170,112 @@ class NumericDeviation(Calculation):
         return self.data
 
 
+class CalculateProportioningMetrics(Calculation):
+    """
+    Fused version of CaclulateDateDelta + CaclulatPercent + IsInTolerance + NumericDeviation for the proportioning tables.
+    Converts the columns to numeric/datetime once and computes every derived column with array operations
+    (no per-row Python callbacks). The result is identical to chaining the four classes:
+        - `end` is overwritten with the formatted duration (end - start)
+        - calc_per = requested × tolerance ÷ 100
+        - Deviation = 1 Over / 2 Within / 3 Under Tolerance / 4 Requested Negative
+        - NumericDeviationkg and NumericDeviationPercent
+    """
+    def __init__(self, data: pd.DataFrame, start: str, end: str, requested: str, actual: str, tolerance: str):
+        super().__init__(data)
+        self.start = start
+        self.end = end
+        self.requested = requested
+        self.actual = actual
+        self.tolerance = tolerance
+
+    def apply_calculation(self) -> pd.DataFrame:
+        # Convert the types once
+        start = self.to_datetime(self.data[self.start])
+        end = self.to_datetime(self.data[self.end])
+        requested = pd.to_numeric(self.data[self.requested], errors="coerce")
+        actual = pd.to_numeric(self.data[self.actual], errors="coerce")
+        tolerance = pd.to_numeric(self.data[self.tolerance], errors="coerce")
+
+        self.data[self.start] = start
+        self.data[self.requested] = requested
+        self.data[self.actual] = actual
+        self.data[self.tolerance] = tolerance
+
+        # Duration (overwrites the end column)
+        self.data[self.end] = self.format_duration((end - start).dt.total_seconds().to_numpy(dtype=float))
+        # Percentage of the requested amount
+        self.data["calc_per"] = (requested * tolerance / 100).round(2)
+        # Deviation class
+        self.data["Deviation"] = self.deviation_class(requested.to_numpy(), actual.to_numpy(), tolerance.to_numpy())
+        # Numeric deviations
+        numdeviation, percentage_deviation = self.numeric_deviations(requested, actual)
+        self.data["NumericDeviationkg"] = ReadableDataFormatter.format_unique(numdeviation.to_numpy(dtype=float), lambda value: f"{value} kg")
+        self.data["NumericDeviationPercent"] = ReadableDataFormatter.format_unique(percentage_deviation.to_numpy(dtype=float), lambda value: f"{value} %")
+
+        return self.data
+
+    @staticmethod
+    def to_datetime(column: pd.Series) -> pd.Series:
+        # Columns read from the database are already datetime64, pd.to_datetime would only scan them again
+        if pd.api.types.is_datetime64_any_dtype(column):
+            return column
+        return pd.to_datetime(column, errors="coerce")
+
+    @staticmethod
+    def format_duration(seconds: np.ndarray) -> np.ndarray:
+        """
+        Format durations in seconds as CaclulateDateDelta does: "12.3 s" up to 60 s, "1:05 min" above, None for NaN.
+        """
+        if len(seconds) == 0:
+            return seconds # Same float64 empty column as CaclulateDateDelta
+
+        # round(x, 1) as Python does it. np.round only differs from it next to the ties, those few are rounded by Python
+        rounded = np.round(seconds, 1)
+        scaled = seconds * 10
+        near_tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+        rounded[near_tie] = [round(value, 1) for value in seconds[near_tie].tolist()]
+
+        def duration_text(seconds):
+            if np.isnan(seconds):
+                return None
+            if seconds > 60:
+                return f"{int(seconds // 60)}:{int(seconds % 60):02d} min"
+            return f"{seconds:.1f} s"
+
+        return ReadableDataFormatter.format_unique(rounded, duration_text)
+
+    @staticmethod
+    def deviation_class(requested: np.ndarray, actual: np.ndarray, tolerance: np.ndarray) -> np.ndarray:
+        """
+        1 = Over Tolerance, 2 = Within Tolerance, 3 = Under Tolerance, 4 = Requested Negative (same as IsInTolerance)
+        """
+        tol_fraction = tolerance / 100
+        upper_tol = requested * (1 + tol_fraction)
+        lower_tol = requested * (1 - tol_fraction)
+
+        deviation = np.full(len(requested), 2, dtype=np.int64) # Default: Within tolerance
+        deviation[actual > upper_tol] = 1  # Over
+        deviation[actual < lower_tol] = 3  # Under
+        deviation[requested < 0] = 4  # Requested negative ("Fill the box")
+        return deviation
+
+    @staticmethod
+    def numeric_deviations(requested: pd.Series, actual: pd.Series):
+        """
+        Deviation in kg (rounded to 3 decimals) and in % (rounded to 2 decimals), 0.0 for "Fill the box" (requested == -1).
+        Same as NumericDeviation, without copying the DataFrame.
+        """
+        mask_fill_box = requested == -1
+        requested = requested.mask(mask_fill_box, actual) # requested = actual to prevent division by -1
+
+        numdeviation = actual - requested
+        percentage_deviation = (actual * 100) / requested - 100
+        numdeviation[mask_fill_box] = 0.0
+        percentage_deviation[mask_fill_box] = 0.0
+
+        return numdeviation.round(3), percentage_deviation.round(2)
+
+
 class CalculateLogTraces(Calculation):
     """
     CalculateLogTraces is a subclass of Calculation for performing logarithmic calculations
@@ -193,7 +301,7 @@ class CalculateLogTraces(Calculation):
         self.size = size
         self.grades = grades
 
-    def apply_calculation(self):
+    def apply_calculation(self, coefficients=None):
         # Generate an empty list for traces
         trace_list = []
 
@@ -206,21 +314,31 @@ class CalculateLogTraces(Calculation):
         # Generate a range of values for plotting them
         x_range = np.linspace(self.df[f"log_{self.x_data}"].min(), self.df[f"log_{self.x_data}"].max(), self.bins)  # 'Bins' values evenly spaced
         
-        # Polynomial regressions (this will include linear regression as grade 1)
-        trace_list = self.polynomical_regressions(trace_list, x_range, self.x_data, self.y_data, self.grades)
+        # Polynomial regressions (this will include linear regression as grade 1). Cached coefficients only need the evaluation
+        if coefficients is None:
+            coefficients = self.fit_coefficients()
+        trace_list = self.polynomical_regressions(trace_list, x_range, coefficients)
 
         # Return traces
         return trace_list
+
+    def fit_coefficients(self):
+        """
+        Coefficients of every grade in self.grades ({grade: coefficients, highest power first}), from a single
+        QR factorization of the log10(x) Vandermonde matrix (same values as np.polyfit per grade).
+        """
+        log_x = np.log10(self.df[self.x_data].to_numpy(dtype=float))
+        regression = LeastSquaresPolynomial(log_x, self.df[self.y_data].to_numpy(dtype=float), self.grades[1])
+        return regression.fit_degrees(range(self.grades[0], self.grades[1] + 1))
     
-    def polynomical_regressions(self, trace_list, x_range, x_data, y_data, grades):
+    def polynomical_regressions(self, trace_list, x_range, coefficients):
         #Define colors for the different traces
         colors = ["grey", "red", "lime", "orange", "yellow", "purple", "cyan", "magenta", "brown", "darkgreen", "pink"]
         
         poly_range = 10 ** x_range
 
         for grade in range(self.grades[0], self.grades[1] + 1):
-            coefs = np.polyfit(self.df[f'log_{x_data}'], self.df[y_data], grade)
-            y_deg = np.polyval(coefs, x_range) 
+            y_deg = np.polyval(coefficients[grade], x_range) 
             
             if grade == 1:
                 trace_list.append(TraceData(label="Linear Regression", x_data=poly_range,  y_data=y_deg, mode="lines", color=colors[grade-1], dash="dash")) #1st Grade
@@ -1,17 +1,62 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, AsyncIterator
 import asyncio
+import re
+import struct
+import time
+import numpy as np
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from backend.classes.pool_monitor import PoolMonitor
+from backend.memory.state import frame_cache
+from backend.database.query import query_proportioning_finished
 
 class DBConnection:
     """
     Handles the connection to the database. Provides methods to connect, disconnect, and manage
     the database session or cursor. Intended to be used as a utility class for database operations.
+    Queries are sent with bound parameters (:current_prop, :current_lot, :rows...), never formatted into the SQL,
+    so every connection of the pool can prepare them once on the server and reuse the plan (psycopg 3).
+    fetch_df/fetch_data run on an async engine (no executor thread per query). The synchronous engine is kept
+    for the thread-offload path (_connect_and_fetch_df), used by the benchmarks.
+    Both engines use the pool settings of the optional "Pool" section of the environment config (see POOL_DEFAULTS),
+    and the time spent waiting for a pooled connection is recorded in `pool_monitor` (see pool_stats()).
+    Large signal reads (amadeus_logging, amadeus_vms_logging) can use the bulk mode (bulk=True): the server packs every
+    column in one binary array and NumPy decodes it at once, instead of building one Python tuple per row.
     """
+    PREPARE_THRESHOLD = 1 # Executions of the same statement before psycopg prepares it on the connection
+    PREPARED_MAX = 100 # Prepared statements kept per connection (least recently used are deallocated)
+    POOL_DEFAULTS = {
+        "Size": 5, # Connections kept open in the pool
+        "MaxOverflow": 10, # Extra connections opened at peaks (closed when returned)
+        "Recycle": -1, # Seconds before a connection is replaced (-1: never)
+        "PrePing": True, # Check the connection on every checkout (one extra round trip)
+        "Timeout": 30, # Seconds to wait for a free connection before failing
+        "StatementTimeout": None, # Milliseconds before the server cancels a query (None: server default)
+    }
+    BULK_TYPES = { # PostgreSQL type OID -> (element of the binary array, dtype of the DataFrame column, value sent for NULL)
+        16: ("?", "bool", "false"), # boolean
+        21: (">i2", "int64", "0"), # smallint
+        23: (">i4", "int64", "0"), # integer
+        20: (">i8", "int64", "0"), # bigint
+        700: (">f4", "float32", "'NaN'"), # real (converted to float64 by _real_to_float64)
+        701: (">f8", "float64", "'NaN'"), # double precision
+    }
+    POWERS_OF_TEN = 10.0 ** np.arange(23) # Exact in float64
+    BULK_ORDER_BY = re.compile(r"^.*\bORDER\s+BY\s+(?P<order>.+?)(?:\s+LIMIT\s+[^;]+?)?\s*;?\s*$", re.IGNORECASE | re.DOTALL) # Last ORDER BY (and LIMIT)
+    STREAM_CHUNK_SIZE = 2000 # Rows per chunk of stream_df (every chunk adds a FETCH and the per-chunk calculations)
 
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], name: str = None):
         self.config = config
+        self.name = name # Environment name (part of the cache keys)
         self.engine = None
+        self.async_engine = None
+        self._compiled_queries = {} # SQL with :name parameters -> SQL for the psycopg cursor
+        self._bulk_columns = {} # Query -> [(column name, type OID)] of its result, for the bulk mode
+        self._inflight = {} # Fetches currently running, shared by identical concurrent requests
+        self._finished_props = set() # Proportionings already known as finished (their rows never change again)
+        self.pool_monitor = PoolMonitor() # Wait times of the async engine checkouts
         
         
     def _get_engine(self):
@@ -21,48 +66,382 @@ class DBConnection:
         
         if self.engine is None:
             if self.engine is None:
-                user = self.config['ConnectionStrings']['UserID']
-                password = self.config['ConnectionStrings']['Password']
-                host = self.config['ConnectionStrings']['Server']
-                port = self.config['ConnectionStrings']['Port']
-                dbname = self.config['ConnectionStrings']['Database']
-                connection_str = f"postgresql+psycopg2://{user}:{password}@{host}:{port}/{dbname}" # String for SQLAlchemy engine
-                self.engine = create_engine(connection_str, pool_pre_ping=True) #Pool pre ping to avoid disconnections (it checks if the connection is alive before using it)
+                self.engine = create_engine(self._connection_str(), **self._engine_options()) #Pool configured by the "Pool" section of the environment
+                event.listen(self.engine, "connect", self._configure_prepared_statements) #Server-side prepared statements on every new connection
         
         return self.engine
+
+    def _get_async_engine(self):
+        """
+        Generate the async engine (psycopg 3 AsyncConnection) if doesn't exist, it return it for future use
+        """
+        if self.async_engine is None:
+            self.async_engine = create_async_engine(self._connection_str(), **self._engine_options())
+            event.listen(self.async_engine.sync_engine, "connect", self._configure_prepared_statements)
+
+        return self.async_engine
+
+    def _connection_str(self) -> str:
+        user = self.config['ConnectionStrings']['UserID']
+        password = self.config['ConnectionStrings']['Password']
+        host = self.config['ConnectionStrings']['Server']
+        port = self.config['ConnectionStrings']['Port']
+        dbname = self.config['ConnectionStrings']['Database']
+        return f"postgresql+psycopg://{user}:{password}@{host}:{port}/{dbname}" # String for SQLAlchemy engine (psycopg 3, sync and async)
     
-    def _connect_and_fetch_df(self, query: str, current_prop =None) -> pd.DataFrame:
+    def pool_settings(self) -> Dict[str, Any]:
+        """
+        Pool settings of the environment: POOL_DEFAULTS overridden by the "Pool" section of the config, e.g.
+        "Pool": {"Size": 10, "MaxOverflow": 20, "Recycle": 1800, "PrePing": False, "Timeout": 10, "StatementTimeout": 60000}
+        """
+        return {**self.POOL_DEFAULTS, **self.config.get("Pool", {})}
+
+    def _engine_options(self) -> Dict[str, Any]:
+        settings = self.pool_settings()
+        options = {
+            "pool_size": settings["Size"],
+            "max_overflow": settings["MaxOverflow"],
+            "pool_recycle": settings["Recycle"],
+            "pool_pre_ping": settings["PrePing"], #Pre ping avoids stale connections, without it rely on Recycle
+            "pool_timeout": settings["Timeout"],
+        }
+        if settings["StatementTimeout"] is not None:
+            options["connect_args"] = {"options": f"-c statement_timeout={int(settings['StatementTimeout'])}"} #Set once per connection, at login
+        return options
+
+    def pool_stats(self) -> Dict[str, Any]:
+        """
+        Live state of the async engine pool (the one serving the requests) and the checkout wait times.
+        """
+        stats = {"settings": self.pool_settings(), "connected": self.async_engine is not None}
+
+        if self.async_engine is not None:
+            pool = self.async_engine.pool
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0), # QueuePool counts the unused capacity as negative overflow
+            })
+
+        stats.update(self.pool_monitor.stats())
+        return stats
+
+    def _configure_prepared_statements(self, dbapi_connection, connection_record):
+        connection = getattr(dbapi_connection, "driver_connection", dbapi_connection) # The async engine wraps the psycopg connection
+        connection.prepare_threshold = self.PREPARE_THRESHOLD
+        connection.prepared_max = self.PREPARED_MAX
+
+    @staticmethod
+    def _bind_params(current_prop=None, current_lot=None, **params) -> Dict[str, Any]:
+        # current_prop/current_lot are the usual parameters, any other :name of the query is given by keyword
+        if current_prop is not None:
+            params["current_prop"] = current_prop
+        if current_lot is not None:
+            params["current_lot"] = current_lot
+        return params
+
+    def _connect_and_fetch_df(self, query: str, params: Dict[str, Any] = None) -> pd.DataFrame:
         try:
             engine = self._get_engine() # Get or create the SQLAlchemy engine
-            
-            if current_prop is not None:
-                query = query.format(current_prop=current_prop) # Format the query with current_prop if provided
 
-            return pd.read_sql(query, engine) # Use pandas to execute the query and return a DataFrame
+            with engine.connect() as connection:
+                return pd.read_sql(text(query), connection, params=params or {}) # Use pandas to execute the query (bound parameters) and return a DataFrame
         
         except Exception as e:
             raise Exception(f"Error executing query: {e}")
 
-    def _connect_and_fetch(self, query: str) -> List[Dict[str, Any]]:
+    def _connect_and_fetch(self, query: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         try:
-            df = self._connect_and_fetch_df(query)
+            df = self._connect_and_fetch_df(query, params)
             return df.to_dict(orient='records')
         
         except Exception as e:
             raise Exception(f"Error executing query: {e}")
 
     
+    async def _execute(self, query: str, params: Dict[str, Any] = None, binary: bool = False):
+        """
+        Run the query on a pooled connection of the async engine and return the cursor description and all the rows.
+        """
+        engine = self._get_async_engine()
+
+        checkout_start = time.perf_counter()
+        try:
+            async with engine.connect() as connection:
+                self.pool_monitor.record_wait(time.perf_counter() - checkout_start) # Queue wait + connect/pre ping
+                # The rows are read with the psycopg cursor (tuples built in C), not through SQLAlchemy Row objects
+                raw_connection = await connection.get_raw_connection()
+                async with raw_connection.driver_connection.cursor(binary=binary) as cursor:
+                    await cursor.execute(self._compile(query, engine.dialect), params or {})
+                    return cursor.description, await cursor.fetchall()
+
+        except PoolTimeoutError:
+            self.pool_monitor.record_timeout()
+            raise
+
+    async def _fetch_df_async(self, query: str, params: Dict[str, Any] = None) -> pd.DataFrame:
+        try:
+            description, rows = await self._execute(query, params)
+            columns = [column.name for column in description]
+
+            # Same DataFrame as pd.read_sql, built straight from the result rows and columns
+            return self._frame_from_rows(rows, columns)
+
+        except Exception as e:
+            raise Exception(f"Error executing query: {e}")
+
+    @staticmethod
+    def _frame_from_rows(rows: List[tuple], columns: List[str]) -> pd.DataFrame:
+        """
+        DataFrame of the result rows, with the timestamptz columns in UTC like pd.read_sql gives them (psycopg returns
+        them in the time zone of the session).
+        """
+        df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+        for position, dtype in enumerate(df.dtypes):
+            if isinstance(dtype, pd.DatetimeTZDtype):
+                df.isetitem(position, df.iloc[:, position].dt.tz_convert("UTC")) # By position (SELECT * with JOIN repeats names)
+        return df
+
+    async def _fetch_df_bulk(self, query: str, params: Dict[str, Any] = None) -> pd.DataFrame:
+        """
+        Same DataFrame as _fetch_df_async, read as one row of binary arrays (see _bulk_query). Queries with columns
+        that aren't boolean/integer/float (see BULK_TYPES) are read row by row.
+        """
+        try:
+            columns = self._bulk_columns.get(query)
+            if columns is None:
+                description, _ = await self._execute(f"SELECT * FROM ({self._subquery(query)}) AS bulk LIMIT 0", params) # Result columns, once per query
+                columns = [(column.name, column.type_code) for column in description]
+                self._bulk_columns[query] = columns
+
+            if any(type_code not in self.BULK_TYPES for _, type_code in columns):
+                return await self._fetch_df_async(query, params)
+
+            _, rows = await self._execute(self._bulk_query(query, columns), params, binary=True)
+
+            if rows[0][0] is None: # No rows (array_agg of nothing is NULL)
+                return pd.DataFrame(columns=[name for name, _ in columns])
+
+            arrays = iter(rows[0]) # Values of every column, followed by its NULL mask for integer/boolean columns
+            return pd.DataFrame({name: self._decode_array(next(arrays), next(arrays) if self._bulk_has_mask(type_code) else None, *self.BULK_TYPES[type_code][:2])
+                                 for name, type_code in columns})
+
+        except Exception as e:
+            raise Exception(f"Error executing query: {e}")
+
+    @classmethod
+    def _bulk_query(cls, query: str, columns: List[Any]) -> str:
+        """
+        SELECT array_send(array_agg(col ORDER BY ...)), ... FROM (query). Every array has one fixed size element per row,
+        so it is decoded with one np.frombuffer call: NULLs are sent as NaN in float columns (the value the row path
+        gives them) and as 0/false in integer/boolean columns, followed by their NULL mask (array of col IS NULL, only
+        sent when the column has NULLs). The row order of the query (its last ORDER BY) is numbered in the subquery and
+        applied inside every array_agg.
+        """
+        query = cls._subquery(query)
+        order = ""
+        match = cls.BULK_ORDER_BY.match(query)
+        if match:
+            query = re.sub(r"^\s*SELECT\b", f"SELECT row_number() OVER (ORDER BY {match.group('order')}) AS bulk_row_number,", query, count=1, flags=re.IGNORECASE)
+            order = " ORDER BY bulk.bulk_row_number"
+
+        arrays = []
+        for name, type_code in columns:
+            column = f'bulk."{name}"'
+            arrays.append(f"array_send(array_agg(coalesce({column}, {cls.BULK_TYPES[type_code][2]}){order}))")
+            if cls._bulk_has_mask(type_code):
+                arrays.append(f"CASE WHEN count({column}) < count(*) THEN array_send(array_agg({column} IS NULL{order})) END")
+        return f"SELECT {', '.join(arrays)} FROM ({query}) AS bulk"
+
+    @classmethod
+    def _bulk_has_mask(cls, type_code: int) -> bool:
+        return cls.BULK_TYPES[type_code][2] != "'NaN'"
+
+    @staticmethod
+    def _subquery(query: str) -> str:
+        return query.strip().rstrip(";")
+
+    @staticmethod
+    def _decode_array(data: bytes, nulls: bytes, element: str, dtype: str):
+        # Binary array without NULLs: ndim, has nulls, element OID, (size, lower bound) of the dimension, then (length, value) per element
+        _, _, _, size, _ = struct.unpack_from(">iiiii", data)
+        values = np.frombuffer(data, dtype=[("length", ">i4"), ("value", element)], count=size, offset=20)["value"].astype(dtype)
+        if dtype == "float32":
+            values = DBConnection._real_to_float64(values)
+        if nulls is None:
+            return values
+
+        # NULLs as the row path reads them: NaN in number columns, None in boolean columns
+        mask = DBConnection._decode_array(nulls, None, "?", "bool")
+        if dtype == "bool":
+            values = values.astype(object)
+            values[mask] = None
+            return values
+        values = values.astype("float64")
+        values[mask] = np.nan
+        return values
+
+    @staticmethod
+    def _real_to_float64(values: np.ndarray) -> np.ndarray:
+        """
+        float32 values -> float64 of their shortest decimal text, the value pandas gets for a real column read
+        row by row (PostgreSQL sends "20.019608", not 20.019607543945312). Keeps the same results and JSON sizes.
+        For every unique value, the shortest round trip is found with a binary search on the significant digits.
+        """
+        unique, inverse = np.unique(values.view(np.uint32), return_inverse=True) # Signals repeat a lot of values
+        unique = unique.view(np.float32)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            wide = unique.astype(np.float64)
+            magnitude = np.floor(np.log10(np.abs(wide)))
+        exact = np.isfinite(magnitude) & (magnitude >= -14) & (magnitude <= 13) # 10 ** exponent is exact for 1 to 9 digits
+        magnitude = np.where(exact, magnitude, 0).astype(np.int64)
+
+        def rounded(digits):
+            exponent = digits - 1 - magnitude
+            scale = DBConnection.POWERS_OF_TEN[np.abs(exponent)]
+            return np.where(exponent >= 0, np.rint(wide * scale) / scale, np.rint(wide / scale) * scale)
+
+        # Smallest number of digits (1 to 9) that gives back the same float32
+        low = np.ones(len(unique), dtype=np.int64)
+        high = np.full(len(unique), 9)
+        while (low < high).any():
+            middle = (low + high) // 2
+            round_trip = rounded(middle).astype(np.float32) == unique
+            high = np.where(round_trip, middle, high)
+            low = np.where(round_trip, low, middle + 1)
+
+        result = rounded(low)
+        other = ~exact | (result.astype(np.float32) != unique) # 0, NaN, inf, very large/small values
+        result[other] = unique[other].astype(str).astype(np.float64)
+        return result[inverse]
+
+    def _compile(self, query: str, dialect) -> str:
+        # :name parameters -> the driver's %(name)s placeholders (compiled once per query)
+        compiled = self._compiled_queries.get(query)
+        if compiled is None:
+            compiled = str(text(query).compile(dialect=dialect))
+            self._compiled_queries[query] = compiled
+        return compiled
+
     def close(self):
         """
-        Close the engine and all its connections if it exists.
+        Close the engine and all its connections if it exists (the async engine is closed with aclose()).
         """
         if self.engine:
             self.engine.dispose()
             self.engine = None
+
+    async def aclose(self):
+        """
+        Close both engines and all their connections.
+        """
+        self.close()
+        if self.async_engine:
+            await self.async_engine.dispose()
+            self.async_engine = None
     
-    # Asynchronous method that runs the blocking code in a separate thread
-    async def fetch_data(self, query: str) -> List[Dict[str, Any]]:
-        return await asyncio.to_thread(self._connect_and_fetch, query)      
-    # Asynchronous method that runs the blocking code in a separate thread   
-    async def fetch_df(self, query: str, current_prop=None) -> pd.DataFrame:
-        return await asyncio.to_thread(self._connect_and_fetch_df, query, current_prop)
+    # Asynchronous method that fetches the data on the async engine
+    async def fetch_data(self, query: str, current_prop=None, current_lot=None, **params) -> List[Dict[str, Any]]:
+        df = await self.fetch_df(query, current_prop, current_lot, **params)
+        return df.to_dict(orient='records')
+    # Asynchronous method that fetches the data on the async engine (no executor thread), bulk=True for large signal reads
+    async def fetch_df(self, query: str, current_prop=None, current_lot=None, bulk: bool = False, **params) -> pd.DataFrame:
+        if bulk:
+            return await self._fetch_df_bulk(query, self._bind_params(current_prop, current_lot, **params))
+        return await self._fetch_df_async(query, self._bind_params(current_prop, current_lot, **params))
+    # Asynchronous generator that reads the result in chunks (server-side cursor), for streamed responses
+    async def stream_df(self, query: str, current_prop=None, current_lot=None, chunk_size: int = None, **params) -> AsyncIterator[pd.DataFrame]:
+        """
+        Yield the result as DataFrames of chunk_size rows (STREAM_CHUNK_SIZE by default), read with a server-side cursor
+        (DECLARE/FETCH): only one chunk is in memory at a time and the first rows come before the query finishes.
+        The pooled connection stays checked out until the generator ends (or is closed, e.g. the client disconnects).
+        """
+        params = self._bind_params(current_prop, current_lot, **params)
+        engine = self._get_async_engine()
+
+        checkout_start = time.perf_counter()
+        try:
+            async with engine.connect() as connection:
+                self.pool_monitor.record_wait(time.perf_counter() - checkout_start) # Queue wait + connect/pre ping
+                raw_connection = await connection.get_raw_connection()
+                async with raw_connection.driver_connection.cursor(name="amalyzer_stream") as cursor: # Named cursor -> server-side
+                    await cursor.execute(self._compile(query, engine.dialect), params)
+                    columns = None
+
+                    while True:
+                        rows = await cursor.fetchmany(chunk_size or self.STREAM_CHUNK_SIZE)
+                        if columns is None:
+                            columns = [column.name for column in cursor.description]
+                        if not rows:
+                            break
+                        yield self._frame_from_rows(rows, columns)
+
+        except PoolTimeoutError as e:
+            self.pool_monitor.record_timeout()
+            raise Exception(f"Error executing query: {e}")
+
+        except Exception as e:
+            raise Exception(f"Error executing query: {e}")
+    # Asynchronous method that shares one database round trip between identical concurrent requests
+    async def fetch_df_shared(self, query: str, current_prop=None, current_lot=None, **params) -> pd.DataFrame:
+        """
+        Same as fetch_df, but if the same query with the same parameters is already running (e.g. the
+        three Analyzer graphs requested at once), it waits for that result instead of querying again.
+        The returned DataFrame is a shallow copy: add columns freely, but don't modify values in place.
+        """
+        key = ("fetch", query, current_prop, current_lot, tuple(sorted(params.items())))
+        df = await self._share(key, lambda: self.fetch_df(query, current_prop, current_lot, **params))
+        return df.copy(deep=False)
+    # Asynchronous method that serves per-proportioning/per-lot frames from the in-process cache
+    async def fetch_df_cached(self, query: str, current_prop=None, current_lot=None, bulk: bool = False) -> pd.DataFrame:
+        """
+        Same as fetch_df_shared, but the result is kept in `frame_cache`, keyed by (environment, query, proportioning, lot).
+        Frames of a finished proportioning are pinned as immutable (they stay until evicted by the memory bound),
+        everything else (running proportionings, lots that keep growing) expires after the cache TTL.
+        """
+        key = (self.name, query, current_prop, current_lot)
+        df = frame_cache.get(key)
+
+        if df is None:
+            df = await self._share(("cache",) + key, lambda: self._fetch_and_cache(key, query, current_prop, current_lot, bulk))
+
+        return df.copy(deep=False)
+
+    async def _fetch_and_cache(self, key, query: str, current_prop=None, current_lot=None, bulk: bool = False) -> pd.DataFrame:
+        # Check the status BEFORE reading the rows: if it was finished then, the rows read are complete
+        immutable = current_lot is None and current_prop is not None and await self.is_proportioning_finished(current_prop)
+
+        df = await self.fetch_df(query, current_prop, current_lot, bulk)
+        frame_cache.put(key, df, immutable=immutable)
+        return df
+
+    async def is_proportioning_finished(self, current_prop) -> bool:
+        """
+        Return True if the proportioning has finished (it has an end time), which means that its logging rows are final.
+        Finished proportionings are remembered, so the check only hits the database while it is still running.
+        """
+        if current_prop in self._finished_props:
+            return True
+
+        df = await self.fetch_df_shared(query_proportioning_finished, current_prop)
+        finished = not df.empty and bool(df["Finished"].iloc[0])
+
+        if finished:
+            self._finished_props.add(current_prop)
+        return finished
+
+    async def _share(self, key, fetch):
+        """
+        Run `fetch()` once for all the concurrent callers with the same key and return its result to all of them.
+        """
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(fetch())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        # Shield the shared fetch, so a cancelled request doesn't cancel it for the others
+        return await asyncio.shield(task)
@@ -0,0 +1,111 @@
+import numpy as np
+import pandas as pd
+from typing import List, Optional
+from datetime import date, tzinfo
+from dateutil.tz import tzlocal
+from backend.classes.calculation import CalculateProportioningMetrics
+
+class DosingRollup:
+    """
+    Dosing KPIs pre-aggregated per ArticleDBID, DosingLocation, TypeOfDosing and day (StartTime), updated with every
+    batch of finished proportionings (ProportioningFeed). Only sums and counts are kept, so any coarser grouping
+    (per article, per location, whole period...) is answered by adding rows of this table, without reading the
+    proportionings again. Deviation classes and numeric deviations are the ones of the proportionings table
+    (IsInTolerance/NumericDeviation, as fused in CalculateProportioningMetrics).
+    Days are plant-local calendar days (timezone, the zone of the server by default), kept as naive dates.
+    """
+    KEYS = ["ArticleDBID", "DosingLocation", "TypeOfDosing", "Day"]
+    SUMS = ["Count", "OverTolerance", "WithinTolerance", "UnderTolerance", "Filler",
+            "Measured", "AbsDeviationKg", "AbsDeviationPercent", "DeviationPercent", "SquaredDeviationPercent"]
+
+    def __init__(self, timezone: Optional[tzinfo] = None):
+        self.timezone = timezone or tzlocal()
+        self.table = pd.DataFrame(columns=self.SUMS, index=pd.MultiIndex.from_arrays([[]] * len(self.KEYS), names=self.KEYS), dtype="float64")
+        self.article_names = {} # ArticleDBID -> ArticleName (last name read)
+
+    def update(self, rows: pd.DataFrame):
+        requested = pd.to_numeric(rows["Requested"], errors="coerce")
+        actual = pd.to_numeric(rows["Actual"], errors="coerce")
+        tolerance = pd.to_numeric(rows["Tolerance"], errors="coerce")
+
+        deviation = CalculateProportioningMetrics.deviation_class(requested.to_numpy(), actual.to_numpy(), tolerance.to_numpy())
+        deviation_kg, deviation_percent = CalculateProportioningMetrics.numeric_deviations(requested, actual)
+        deviation_kg, deviation_percent = deviation_kg.to_numpy(dtype=float), deviation_percent.to_numpy(dtype=float)
+        # Deviation statistics only for real dosings (not "Fill the box") with a finite deviation (requested 0 gives inf %)
+        measured = (deviation != 4) & np.isfinite(deviation_kg) & np.isfinite(deviation_percent)
+
+        frame = pd.DataFrame({
+            "ArticleDBID": rows["ArticleDBID"].astype("int64").to_numpy(),
+            "DosingLocation": rows["DosingLocation"].fillna(0).astype("int64").to_numpy(), # 0 = unknown (NULL in the database)
+            "TypeOfDosing": rows["TypeOfDosing"].fillna(0).astype("int64").to_numpy(),
+            "Day": self.local_days(rows["StartTime"]).to_numpy(), # Without StartTime -> not aggregated
+            "Count": 1.0,
+            "OverTolerance": deviation == 1,
+            "WithinTolerance": deviation == 2,
+            "UnderTolerance": deviation == 3,
+            "Filler": deviation == 4,
+            "Measured": measured,
+            "AbsDeviationKg": np.where(measured, np.abs(deviation_kg), 0.0),
+            "AbsDeviationPercent": np.where(measured, np.abs(deviation_percent), 0.0),
+            "DeviationPercent": np.where(measured, deviation_percent, 0.0),
+            "SquaredDeviationPercent": np.where(measured, deviation_percent ** 2, 0.0),
+        })
+        sums = frame.groupby(self.KEYS).sum().astype("float64")
+
+        self.table = sums if self.table.empty else self.table.add(sums, fill_value=0)
+        self.article_names.update(zip(rows["ArticleDBID"].tolist(), rows["ArticleName"].tolist()))
+
+    def local_days(self, start_time: pd.Series) -> pd.Series:
+        # timestamptz columns are read in UTC: the day starts at the plant's midnight (naive timestamps are already local)
+        start_time = CalculateProportioningMetrics.to_datetime(start_time)
+        if isinstance(start_time.dtype, pd.DatetimeTZDtype):
+            start_time = start_time.dt.tz_convert(self.timezone).dt.tz_localize(None)
+        return start_time.dt.floor("D")
+
+    def kpis(self, group_by: List[str], article_dbid: Optional[int] = None, location: Optional[int] = None, dosing_type: Optional[int] = None,
+             date_from: Optional[date] = None, date_to: Optional[date] = None) -> pd.DataFrame:
+        """
+        KPIs grouped by a subset of KEYS (all the filtered rows together if group_by is empty), from the aggregated table:
+        counts per deviation class, out of tolerance rates (over the dosings that aren't "Fill the box"), mean absolute
+        deviation in kg and %, mean (bias) and standard deviation of the deviation %.
+        """
+        table = self.table.reset_index()
+        mask = pd.Series(True, index=table.index)
+        if article_dbid is not None:
+            mask &= table["ArticleDBID"] == article_dbid
+        if location is not None:
+            mask &= table["DosingLocation"] == location
+        if dosing_type is not None:
+            mask &= table["TypeOfDosing"] == dosing_type
+        if date_from is not None:
+            mask &= table["Day"] >= pd.Timestamp(date_from)
+        if date_to is not None:
+            mask &= table["Day"] <= pd.Timestamp(date_to)
+        table = table[mask]
+
+        if group_by:
+            sums = table.groupby(group_by, sort=True)[self.SUMS].sum().reset_index()
+        else:
+            sums = table[self.SUMS].sum().to_frame().T
+
+        classified = sums["OverTolerance"] + sums["WithinTolerance"] + sums["UnderTolerance"]
+        measured = sums["Measured"]
+        mean_percent = sums["DeviationPercent"] / measured
+        variance = (sums["SquaredDeviationPercent"] - measured * mean_percent ** 2) / (measured - 1) # Sample variance
+
+        kpis = sums[group_by].copy() if group_by else pd.DataFrame(index=sums.index)
+        if "ArticleDBID" in group_by:
+            kpis.insert(group_by.index("ArticleDBID") + 1, "ArticleName", kpis["ArticleDBID"].map(self.article_names))
+        if "Day" in group_by:
+            kpis["Day"] = kpis["Day"].dt.date
+        for column in ("Count", "OverTolerance", "WithinTolerance", "UnderTolerance", "Filler"):
+            kpis[column] = sums[column].astype("int64")
+        kpis["OverToleranceRate"] = (sums["OverTolerance"] / classified).round(4)
+        kpis["UnderToleranceRate"] = (sums["UnderTolerance"] / classified).round(4)
+        kpis["OutOfToleranceRate"] = ((sums["OverTolerance"] + sums["UnderTolerance"]) / classified).round(4)
+        kpis["MeanAbsDeviationKg"] = (sums["AbsDeviationKg"] / measured).round(3)
+        kpis["MeanAbsDeviationPercent"] = (sums["AbsDeviationPercent"] / measured).round(2)
+        kpis["MeanDeviationPercent"] = mean_percent.round(2)
+        kpis["StdDeviationPercent"] = np.sqrt(variance.clip(lower=0)).round(2)
+
+        return kpis.replace([np.inf, -np.inf], np.nan)
@@ -0,0 +1,60 @@
+import numpy as np
+from typing import Sequence, Tuple, Union
+
+class Downsampling:
+    """
+    Base class for reducing the number of points of a time series before it is plotted.
+    Subclasses should implement the apply_downsampling() method and return the reduced x and y arrays.
+    """
+    def __init__(self, x_data: Sequence[Union[int, float]], y_data: Sequence[Union[int, float]], max_points: int):
+        self.x_data = np.asarray(x_data, dtype=float)
+        self.y_data = np.asarray(y_data, dtype=float)
+        self.max_points = max_points
+
+    def apply_downsampling(self):
+        raise NotImplementedError(f"Subclasses should implement this method. Call one of: {[cls.__name__ for cls in Downsampling.__subclasses__()]}")
+
+class LTTBDownsampling(Downsampling):
+    """
+    Largest-Triangle-Three-Buckets downsampling. Keeps the first and the last point and, for every bucket
+    in between, the point that forms the largest triangle with the point kept in the previous bucket and
+    the average of the next bucket. Peaks and tolerance crossings stay visible with a fraction of the points.
+    If the series already has `max_points` points or less (or `max_points` < 3), it is returned unchanged.
+    """
+    def __init__(self, x_data, y_data, max_points: int):
+        super().__init__(x_data, y_data, max_points)
+
+    def apply_downsampling(self) -> Tuple[np.ndarray, np.ndarray]:
+        x, y = self.x_data, self.y_data
+        n = len(x)
+
+        if self.max_points is None or self.max_points < 3 or n <= self.max_points:
+            return x, y
+
+        # Bucket edges for the n-2 inner points (first and last point are always kept)
+        edges = np.linspace(1, n - 1, self.max_points - 1).astype(int)
+
+        # Average point of every bucket (used as the third vertex of the triangle)
+        counts = np.diff(edges)
+        avg_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / counts
+        avg_y = np.add.reduceat(np.nan_to_num(y[1:n - 1]), edges[:-1] - 1) / counts
+        # The last bucket looks ahead to the last point
+        avg_x = np.append(avg_x[1:], x[-1])
+        avg_y = np.append(avg_y[1:], y[-1])
+
+        selected = np.empty(self.max_points, dtype=int)
+        selected[0] = 0
+        selected[-1] = n - 1
+
+        a = 0 # Index of the point kept in the previous bucket
+        for bucket in range(self.max_points - 2):
+            start, end = edges[bucket], edges[bucket + 1]
+
+            # Twice the triangle area (the factor does not change the argmax)
+            area = np.abs((x[a] - avg_x[bucket]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y[bucket] - y[a]))
+            area = np.nan_to_num(area, nan=-1.0) # Never prefer NaN samples
+
+            a = start + int(np.argmax(area))
+            selected[bucket + 1] = a
+
+        return x[selected], y[selected]
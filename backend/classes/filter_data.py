@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+import numpy as np
 import pandas as pd
 from typing import List, Dict, Any
 from enum import Enum
@@ -72,14 +73,25 @@ class ReadableDataFormatter:
     Formats columns in a pandas DataFrame to make the data more readable and user-friendly.
     Provides methods to format specific columns such as StartTime, Actual, VMSscan, LotID,
     TypeOfDosing, Tolerance, and Deviation. The apply_all_formats() method applies all formatting.
+    Every column is formatted as a whole (no row-wise apply): enums through precomputed label tables,
+    numbers with their text built once per distinct value.
     """
     def __init__(self, df: pd.DataFrame):
         self.df = df
 
     def format_start_time(self):
         if "StartTime" in self.df.columns:
-            self.df["StartTime"] = pd.to_datetime(self.df["StartTime"], errors="coerce")
-            self.df["StartTime"] = self.df["StartTime"].dt.strftime("%Y-%m-%d  %H:%M") # Format to "YYYY-MM-DD HH:MM" Year-Month-Day Hour:Minute
+            start_time = self.df["StartTime"]
+            if not (isinstance(start_time.dtype, np.dtype) and start_time.dtype.kind == "M"):
+                start_time = pd.to_datetime(start_time, errors="coerce")
+
+            if isinstance(start_time.dtype, np.dtype): # Timezone naive: format the minutes with NumPy ("YYYY-MM-DDTHH:MM")
+                values = start_time.to_numpy()
+                text = np.char.replace(np.datetime_as_string(values, unit="m"), "T", "  ").astype(object)
+                text[np.isnat(values)] = np.nan
+                self.df["StartTime"] = text
+            else:
+                self.df["StartTime"] = start_time.dt.strftime("%Y-%m-%d  %H:%M") # Format to "YYYY-MM-DD HH:MM" Year-Month-Day Hour:Minute
 
     def format_actual(self):
         if "Actual" in self.df.columns:
@@ -91,51 +103,67 @@ class ReadableDataFormatter:
 
     def format_type_of_dosing(self):
         if "TypeOfDosing" in self.df.columns:
-            def format_dosing(val):
-                try:
-                    return DosingType(val).name.capitalize()
-                except ValueError:
-                    return f"Unknown ({val})"
-            self.df["TypeOfDosing"] = self.df["TypeOfDosing"].apply(format_dosing)
+            self.df["TypeOfDosing"] = self.format_enum(self.df["TypeOfDosing"], DOSING_TYPE_LABELS)
 
     def format_tolerance(self):
         if "Tolerance" in self.df.columns and "calc_per" in self.df.columns:
             original_tolerance = self.df["Tolerance"].copy()
             original_calc_per = self.df["calc_per"].copy()
-            
-            def format_tolerance(row):
-                try:
-                    kg = float(original_calc_per[row.name]) 
-                    return f"{kg:.2f} kg"
-                except:
-                    return original_tolerance[row.name]
-            def format_percentage(row):
-                try:
-                    tol = float(original_tolerance[row.name])
-                    return f"{tol:.2f}% "
-                except:
-                    return original_tolerance[row.name]
-                    
-            self.df["Tolerance"] = self.df.apply(format_tolerance, axis=1)
-            self.df["calc_per"] = self.df.apply(format_percentage, axis=1)
+
+            self.df["Tolerance"] = self.format_float(original_calc_per, "{:.2f} kg", original_tolerance)
+            self.df["calc_per"] = self.format_float(original_tolerance, "{:.2f}% ", original_tolerance)
 
     def format_deviation(self):
         if "Deviation" in self.df.columns:
-            def format_deviation(val):
-                try:
-                    return Deviation(val).name.capitalize()
-                except ValueError:
-                    return f"Unknown ({val})"
-            self.df["Deviation"] = self.df["Deviation"].apply(format_deviation)
-
-    def apply_all_formats(self) -> List[Dict[str, Any]]:
+            self.df["Deviation"] = self.format_enum(self.df["Deviation"], DEVIATION_LABELS)
+
+    def apply_all_formats(self) -> pd.DataFrame:
         self.format_start_time()
         self.format_actual()
         self.format_vms_scan()
         self.format_type_of_dosing()
         self.format_tolerance()
         self.format_deviation()
-        return self.df.to_dict(orient="records")
+        return self.df # Serialized by DataFrameJSONResponse
+
+    @staticmethod
+    def format_enum(values: pd.Series, labels: Dict[Any, str]) -> pd.Series:
+        """
+        Replace the enum values with their labels, values that are not in the enum become "Unknown (x)".
+        """
+        text = values.map(labels)
+        unknown = text.isna()
+        if unknown.any():
+            text = text.astype(object)
+            text[unknown] = "Unknown (" + values[unknown].astype(str) + ")"
+        return text
+
+    @staticmethod
+    def format_float(values: pd.Series, template: str, fallback: pd.Series) -> pd.Series:
+        """
+        template.format(float(value)), or the fallback value of the row where the value can't be converted to float.
+        """
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in "biuf": # Plain NumPy numbers always convert
+            text = ReadableDataFormatter.format_unique(values.to_numpy(dtype=float), template.format)
+            return pd.Series(text, index=values.index)
+
+        text = []
+        for value, default in zip(values.tolist(), fallback.tolist()):
+            try:
+                text.append(template.format(float(value)))
+            except (TypeError, ValueError):
+                text.append(default)
+        return pd.Series(text, index=values.index, dtype=object)
+
+    @staticmethod
+    def format_unique(values: np.ndarray, formatter) -> np.ndarray:
+        """
+        Format every distinct value once and map the texts back to all the rows (tables repeat the same rounded values a lot).
+        Values are compared by their bit pattern, so -0.0 and 0.0 keep their own text.
+        """
+        uniques, inverse = np.unique(np.ascontiguousarray(values, dtype=np.float64).view(np.int64), return_inverse=True)
+        texts = np.array([formatter(value) for value in uniques.view(np.float64).tolist()], dtype=object)
+        return texts[inverse.reshape(-1)]
 
 class DosingType(Enum):
     """
@@ -152,4 +180,8 @@ class Deviation(Enum):
     OVERDOSING = 1
     NORMAL = 2
     UNDERDOSING = 3
-    FILLER = 4
\ No newline at end of file
+    FILLER = 4
+
+# Labels of the enum values, as shown in the tables (e.g. 100 -> "D2e")
+DOSING_TYPE_LABELS = {member.value: member.name.capitalize() for member in DosingType}
+DEVIATION_LABELS = {member.value: member.name.capitalize() for member in Deviation}
@@ -0,0 +1,122 @@
+import asyncio
+import multiprocessing
+import os
+import time
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from backend.classes.regression import LeastSquaresPolynomial
+from backend.database.query import query_fleet_intermediates, query_fleet_lots
+
+def fit_lots(lots: List[Tuple[int, np.ndarray, np.ndarray]], grades: Tuple[int, int]) -> List[Dict[str, Any]]:
+    """
+    Fits of a chunk of lots (runs in the worker processes): the same log10(flow) -> opening polynomials as the
+    Regressor graph (CalculateLogTraces), every grade from one LeastSquaresPolynomial, with the RMSE of each grade.
+    """
+    results = []
+    for lot_dbid, flow, opening in lots:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = np.log10(flow)
+        finite = np.isfinite(x) & np.isfinite(opening)
+        x, y = x[finite], opening[finite]
+
+        result = {"lot_dbid": lot_dbid, "Intermediates": len(flow), "FlowMin": float(flow.min()), "FlowMax": float(flow.max())}
+        if len(x):
+            regression = LeastSquaresPolynomial(x, y, grades[1])
+            for degree in range(grades[0], grades[1] + 1):
+                coefficients = regression.coefficients(degree)
+                result[f"Degree{degree}Coefficients"] = coefficients.tolist()
+                result[f"Degree{degree}RMSE"] = float(np.sqrt(np.mean((np.polyval(coefficients, x) - y) ** 2)))
+        results.append(result)
+    return results
+
+class FleetRegression:
+    """
+    Batch computation of the Regressor flow curves of EVERY lot of an environment, to compare them with the flow
+    table of the lots (c1_in_minflow/c1_in_maxflow) without opening the lots one by one.
+    The intermediates of all the lots come from one bulk query (sorted by lot), the fits run in parallel on a process
+    pool (chunks of lots per task) and the last result of every environment is kept in memory.
+    """
+    def __init__(self, max_workers: Optional[int] = None, chunks_per_worker: int = 4):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunks_per_worker = chunks_per_worker
+        self.executor = None # Created on the first run (worker processes only when they are needed)
+        self.jobs = {} # Environment -> {"status", "grades", "started", "finished", "seconds", "error", "rows"}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # Spawned workers: forking the server would copy its event loop, pooled sockets and locks into the children
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self.executor
+
+    def start(self, db_connection, grades: Tuple[int, int]) -> Dict[str, Any]:
+        """
+        Start a batch run in the background for the environment (unless one is already running), return its status.
+        """
+        job = self.jobs.get(db_connection.name)
+        if job is None or job["status"] != "running":
+            job = {"status": "running", "grades": list(grades), "started": pd.Timestamp.now().isoformat(), "finished": None,
+                   "seconds": None, "error": None, "rows": job["rows"] if job else None} # Previous result kept until the new one is ready
+            self.jobs[db_connection.name] = job
+            job["task"] = asyncio.create_task(self._run(db_connection, grades, job))
+        return self.status(db_connection.name)
+
+    def status(self, environment: str) -> Dict[str, Any]:
+        job = self.jobs.get(environment)
+        if job is None:
+            return {"status": "not run"}
+        return {key: value for key, value in job.items() if key not in ("task", "rows")}
+
+    def results(self, environment: str) -> Optional[pd.DataFrame]:
+        job = self.jobs.get(environment)
+        return job["rows"] if job else None
+
+    async def _run(self, db_connection, grades: Tuple[int, int], job: Dict[str, Any]):
+        start = time.perf_counter()
+        try:
+            intermediates, lots = await asyncio.gather(
+                db_connection.fetch_df(query_fleet_intermediates, bulk=True),
+                db_connection.fetch_df(query_fleet_lots),
+            )
+            job["rows"] = await self.compute(intermediates, lots, grades)
+            job["status"] = "done"
+        except Exception as e:
+            print(f"Error: {e}")
+            job["status"], job["error"] = "error", str(e)
+        finally:
+            job["finished"] = pd.Timestamp.now().isoformat()
+            job["seconds"] = round(time.perf_counter() - start, 3)
+
+    async def compute(self, intermediates: pd.DataFrame, lots: pd.DataFrame, grades: Tuple[int, int]) -> pd.DataFrame:
+        # Split the columns by lot (no groupby copies; the bulk read keeps the ORDER BY lot_dbid, intermediate_dbid of the query), then fit chunks of lots on the process pool
+        lot_dbids = intermediates["lot_dbid"].to_numpy()
+        flow = intermediates["flow"].to_numpy(dtype=float)
+        opening = intermediates["opening"].to_numpy(dtype=float)
+        bounds = np.r_[0, np.flatnonzero(np.diff(lot_dbids)) + 1, len(lot_dbids)]
+        per_lot = [(int(lot_dbids[begin]), flow[begin:end], opening[begin:end]) for begin, end in zip(bounds[:-1], bounds[1:]) if end > begin]
+
+        executor = self._get_executor()
+        chunk_count = max(1, min(len(per_lot), self.max_workers * self.chunks_per_worker))
+        chunks = [per_lot[index::chunk_count] for index in range(chunk_count)]
+        loop = asyncio.get_running_loop()
+        fitted = await asyncio.gather(*[loop.run_in_executor(executor, fit_lots, chunk, grades) for chunk in chunks if chunk])
+
+        fits = pd.DataFrame([result for chunk in fitted for result in chunk])
+        if fits.empty:
+            fits = pd.DataFrame(columns=["lot_dbid", "Intermediates", "FlowMin", "FlowMax"])
+
+        # Next to the flow table of every lot (lots without intermediates too) with the observed/table flow ratios
+        rows = lots.merge(fits, on="lot_dbid", how="left")
+        rows["Intermediates"] = rows["Intermediates"].fillna(0).astype("int64")
+        rows["MinFlowRatio"] = rows["FlowMin"] / rows["c1_in_minflow"].replace(0, np.nan)
+        rows["MaxFlowRatio"] = rows["FlowMax"] / rows["c1_in_maxflow"].replace(0, np.nan)
+
+        # Opening of the highest grade curve at the flow table limits
+        highest = f"Degree{grades[1]}Coefficients"
+        if highest in rows:
+            for column, limit in (("OpeningAtMinFlow", "c1_in_minflow"), ("OpeningAtMaxFlow", "c1_in_maxflow")):
+                rows[column] = [float(np.polyval(coefficients, np.log10(value))) if isinstance(coefficients, list) and value and value > 0 else None
+                                for coefficients, value in zip(rows[highest], rows[limit])]
+
+        return rows.sort_values("lot_dbid", ignore_index=True)
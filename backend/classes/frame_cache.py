@@ -0,0 +1,76 @@
+import time
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+class FrameCache:
+    """
+    In-process LRU cache of pandas DataFrames, bounded by the total memory of the cached frames
+    (DataFrame.memory_usage(deep=True)). When a new frame doesn't fit, the least recently used ones are evicted.
+    Frames stored as immutable never expire, the rest expire `ttl` seconds after they were stored.
+    Hit, miss, eviction and expiration counters are kept to size the cache.
+    """
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict() # key -> (DataFrame, size in bytes, expiry time or None if immutable)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[pd.DataFrame]:
+        entry = self.entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        df, _, expires_at = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self.entries.move_to_end(key) # Most recently used
+        self.hits += 1
+        return df
+
+    def put(self, key: Hashable, df: pd.DataFrame, immutable: bool = False):
+        nbytes = int(df.memory_usage(deep=True).sum())
+
+        if key in self.entries:
+            self._remove(key)
+        if nbytes > self.max_bytes:
+            return # It would evict everything and still not fit
+
+        expires_at = None if immutable else time.monotonic() + self.ttl
+        self.entries[key] = (df, nbytes, expires_at)
+        self.bytes += nbytes
+
+        # Evict the least recently used frames until the cache fits again
+        while self.bytes > self.max_bytes:
+            old_key = next(iter(self.entries))
+            self._remove(old_key)
+            self.evictions += 1
+
+    def _remove(self, key: Hashable):
+        _, nbytes, _ = self.entries.pop(key)
+        self.bytes -= nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "immutable_entries": sum(1 for _, _, expires_at in self.entries.values() if expires_at is None),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
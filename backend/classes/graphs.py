@@ -2,7 +2,8 @@ import plotly.graph_objects as go
 import plotly.io as pio
 import numpy as np
 from dataclasses import dataclass, field
-from typing import List, Optional, Union, Sequence
+from typing import Optional, Union, Sequence
+from backend.classes.downsampling import LTTBDownsampling
 
 
 class Graph:
@@ -17,17 +18,26 @@ class Graph:
         self.yaxis_title = yaxis_title
         self.leyend_pos = leyend_pos
     
-    def plot_graph(self):
+    def build_figure(self) -> go.Figure:
         raise NotImplementedError(f"Subclasses should implement this method. Call one of: {[cls.__name__ for cls in Graph.__subclasses__()]}")
+
+    def plot_graph(self) -> str:
+        # Convert graph to HTML (plotly.js is embedded in the snippet)
+        return pio.to_html(self.build_figure(), full_html=False,  config={"responsive": True})
+
+    def plot_json(self) -> str:
+        # Convert graph to a Plotly figure JSON (plotly.js is served once from /static/js/plotly.min.js)
+        return pio.to_json(self.build_figure())
     
-@dataclass
+@dataclass(slots=True)
 class TraceData:
     """
     Data structure for holding trace information for plotting graphs. Stores label, x and y data,
     plot mode, color, and marker/dash style for use in visualization libraries.
+    The data is stored as NumPy float arrays (no Python float per point).
     """
     label: str 
-    x_data: Sequence[Union[int, float]] #Sequences accept Pandas series, list or duples
+    x_data: Sequence[Union[int, float]] #Sequences accept Pandas series, list or duples (stored as np.ndarray)
     y_data: Sequence[Union[int, float]]
     z_data: Optional[Sequence[Union[int, float]]] = None
     mode: str = "lines"
@@ -36,54 +46,70 @@ class TraceData:
     dash: Optional[str] = None
     marker: Optional[dict] = None
     
-    time: Optional[List[float]] = field(init=False, default=None)
+    time: Optional[np.ndarray] = field(init=False, default=None)
     line: dict = field(init=False)
 
     def __post_init__(self):
         # Validate first (better fail early)
         if len(self.x_data) != len(self.y_data):
             raise ValueError(f"x_data and y_data must have the same length for trace '{self.label}'")
-        
-        # Calculate time
-        self.time = (
-            [x * self.sample_time for x in self.x_data]
-            if self.sample_time is not None
-            else list(self.x_data)
-        )
+
+        self.x_data = np.asarray(self.x_data, dtype=float)
+        self.y_data = np.asarray(self.y_data, dtype=float)
+        if self.z_data is not None:
+            self.z_data = np.asarray(self.z_data, dtype=float)
+
+        # Calculate time (one vectorized multiply)
+        self.time = self.x_data * self.sample_time if self.sample_time is not None else self.x_data
 
 
         # Build line dict
         self.line = {"color": self.color}
         if self.dash:
             self.line["dash"] = self.dash
+
+    @classmethod
+    def constant(cls, label: str, value: float, x_data: Sequence[Union[int, float]], **kwargs) -> "TraceData":
+        """
+        Horizontal line at `value` over the range of x_data (e.g. set point and tolerances).
+        Only the first and the last point are kept: two points draw the same line as one per sample.
+        """
+        x_data = np.asarray(x_data, dtype=float)
+        if len(x_data) > 2:
+            x_data = x_data[[0, -1]]
+        return cls(label=label, x_data=x_data, y_data=np.full(len(x_data), value, dtype=float), **kwargs)
   
 class PlotPointsinTime(Graph):
     """
     Generates a 2D plot of points over time using the provided trace data. Inherits from Graph and
     prepares a Plotly figure for time series or sequential data visualization.
+    If `max_points` is given, every trace is reduced to that many points with LTTB before plotting.
     """
-    def __init__(self, title, xaxis_title, yaxis_title, leyend_pos, traces:list[TraceData] ):
+    def __init__(self, title, xaxis_title, yaxis_title, leyend_pos, traces:list[TraceData], max_points: Optional[int] = None):
         super().__init__(title, xaxis_title, yaxis_title, leyend_pos)
         self.traces = traces
+        self.max_points = max_points
 
-    def plot_graph(self):
+    def build_figure(self) -> go.Figure:
         # Generate de graph
         fig =self.fig
 
         #Validate the data
         for trace in self.traces:
+            # Reduce the amount of points sent to the browser (shape preserving)
+            x, y = LTTBDownsampling(trace.time, trace.y_data, self.max_points).apply_downsampling()
 
             fig.add_trace(go.Scatter(
-            x=trace.time,
-            y=trace.y_data,
+            x=x,
+            y=y,
             mode=trace.mode, #"lines",
             name=trace.label,
             line=trace.line,
             ))
 
 
-        max_y = float(max(max(trace.y_data) for trace in self.traces))
-        max_x = float(max(trace.time))
+        max_y = max(float(np.nanmax(trace.y_data)) for trace in self.traces)
+        max_x = max(float(np.nanmax(trace.time)) for trace in self.traces)
 
         # Style
         fig.update_layout(
@@ -106,8 +132,53 @@ class PlotPointsinTime(Graph):
             xaxis=dict(range=[0, max_x],fixedrange=False), #Force to strart in x=0
         )
 
-        # Convert graph to HTML 
-        return pio.to_html(fig, full_html=False,  config={"responsive": True})
+        return fig
+
+class ControlChartPlot(Graph):
+    """
+    Statistical process control chart: the traces (values, EWMA and its limits) on the left Y axis and the
+    cusum_traces (C+, C- and the decision limit) on a second Y axis, over the sample number. Points with a signal
+    are drawn as red markers. Unlike PlotPointsinTime the axes are not forced to start at 0 (deviations are negative too).
+    """
+    def __init__(self, title, xaxis_title, yaxis_title, leyend_pos, traces: list[TraceData], cusum_traces: list[TraceData], signals: Optional[TraceData] = None, cusum_title="CUSUM"):
+        super().__init__(title, xaxis_title, yaxis_title, leyend_pos)
+        self.traces = traces
+        self.cusum_traces = cusum_traces
+        self.signals = signals
+        self.cusum_title = cusum_title
+
+    def build_figure(self) -> go.Figure:
+        fig = self.fig
+
+        for yaxis, traces in (("y", self.traces), ("y2", self.cusum_traces)):
+            for trace in traces:
+                fig.add_trace(go.Scatter(x=trace.time, y=trace.y_data, mode=trace.mode, name=trace.label, line=trace.line, marker=trace.marker, yaxis=yaxis))
+
+        if self.signals is not None and len(self.signals.x_data):
+            fig.add_trace(go.Scatter(x=self.signals.time, y=self.signals.y_data, mode="markers", name=self.signals.label,
+                                     marker=self.signals.marker or dict(color="red", size=9, symbol="x")))
+
+        fig.update_layout(
+            title=self.title,
+            xaxis_title=self.xaxis_title,
+            yaxis=dict(title=self.yaxis_title, zeroline=True),
+            yaxis2=dict(title=self.cusum_title, overlaying="y", side="right", showgrid=False),
+            template="plotly_white",
+            margin=dict(l=20, r=20, t=40, b=20),
+            legend=dict(
+                yanchor=self.leyend_pos[0],
+                y=0.05 if self.leyend_pos[0] == "bottom" else 0.95,
+                xanchor=self.leyend_pos[1],
+                x=0.95 if self.leyend_pos[1] == "right" else 0.05,
+                bgcolor='rgba(255,255,255,0.5)',
+                bordercolor="black",
+                borderwidth=1
+            ),
+            hovermode="x unified",
+            autosize=True,
+        )
+
+        return fig
 
 class LogScatterPlot(Graph):
     """
@@ -118,7 +189,7 @@ class LogScatterPlot(Graph):
         super().__init__(title, xaxis_title, yaxis_title, leyend_pos)
         self.traces = traces
 
-    def plot_graph(self):
+    def build_figure(self) -> go.Figure:
         # Generate de graph
         fig =self.fig
 
@@ -168,8 +239,7 @@ class LogScatterPlot(Graph):
             autosize=True
         )
 
-        # Convert graph to HTML 
-        return pio.to_html(fig, full_html=False,  config={"responsive": True})
+        return fig
 
 
 class Traces3DPlot(Graph):
@@ -187,7 +257,7 @@ class Traces3DPlot(Graph):
         
         self.traces = traces
 
-    def plot_graph(self):
+    def build_figure(self) -> go.Figure:
         #Generate figure
         fig = go.Figure()
 
@@ -217,7 +287,7 @@ class Traces3DPlot(Graph):
         showlegend=True
         )
 
-        return pio.to_html(fig, full_html=False, config={"responsive": True})
+        return fig
 
     
     def plot_traces(self, trace_list):
@@ -0,0 +1,26 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+from backend.database.query import query_proportioning_keys
+
+class ProportioningKeyCache:
+    """
+    Environment-wide mapping of proportionings to their immutable keys (lot_dbid, article_dbid): a proportioning
+    never changes lot or article, so each one is read once per environment and then answered from memory.
+    LRU, bounded by the number of proportionings. Proportionings that don't exist (yet) are not remembered.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # (environment, proportioning_dbid) -> {"lot_dbid", "article_dbid"}
+
+    async def resolve(self, db_connection, current_prop: int) -> Optional[Dict[str, int]]:
+        key = (db_connection.name, current_prop)
+        keys = self.entries.get(key)
+        if keys is None:
+            rows = await db_connection.fetch_data(query_proportioning_keys, current_prop=current_prop)
+            if not rows:
+                return None
+            keys = self.entries[key] = {"lot_dbid": rows[0]["lot_dbid"], "article_dbid": rows[0]["article_dbid"]}
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False) # Least recently used
+        self.entries.move_to_end(key)
+        return keys
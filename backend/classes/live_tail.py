@@ -0,0 +1,129 @@
+import asyncio
+import pandas as pd
+from typing import Any, AsyncIterator, Hashable, Tuple
+
+class LiveTail:
+    """
+    One database poller for the logging rows of one running proportioning, shared by all its subscribers.
+    Every poll reads only the rows after the last logging_dbid already read, and sends them to every subscriber
+    queue. The poll interval is the shortest one asked by the subscribers. The poller stops when the proportioning
+    has finished (after sending its last rows) or when the last subscriber leaves.
+    """
+    def __init__(self, hub: "LiveTailHub", key: Hashable, db_connection, current_prop: int, query: str, last_dbid: int):
+        self.hub = hub
+        self.key = key
+        self.db_connection = db_connection
+        self.current_prop = current_prop
+        self.query = query
+        self.last_dbid = last_dbid # Last logging_dbid read by the poller
+        self.subscribers = {} # Queue -> poll interval (seconds) asked by that subscriber
+        self.task = None
+
+    def add(self, queue: asyncio.Queue, interval: float):
+        self.subscribers[queue] = interval
+        if self.task is None:
+            self.task = asyncio.create_task(self._poll())
+
+    def remove(self, queue: asyncio.Queue):
+        self.subscribers.pop(queue, None)
+        if not self.subscribers:
+            self._close()
+            self.task.cancel()
+
+    def _close(self):
+        # Synchronous, so a new subscriber can't join a poller that is stopping (it gets a new one)
+        if self.hub.tails.get(self.key) is self:
+            del self.hub.tails[self.key]
+
+    def _send(self, event: str, data: Any = None):
+        for queue in self.subscribers:
+            queue.put_nowait((event, data))
+
+    async def _poll(self):
+        try:
+            while self.subscribers:
+                # Check the status BEFORE reading the rows: if it was finished then, the rows read are the last ones
+                finished = await self.db_connection.is_proportioning_finished(self.current_prop)
+
+                async for batch in self.hub.read_after(self.db_connection, self.query, self.current_prop, self.last_dbid):
+                    self.last_dbid = int(batch["logging_dbid"].iloc[-1])
+                    self._send("samples", batch)
+
+                if finished:
+                    self._close()
+                    self._send("end")
+                    return
+
+                await asyncio.sleep(min(self.subscribers.values()))
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._close()
+            self._send("error", str(e))
+
+class LiveTailHub:
+    """
+    Registry of the LiveTail pollers, one per (environment, proportioning). A subscriber that starts behind the
+    poller (e.g. from the beginning of the proportioning, or reconnecting with its last seen logging_dbid) first gets
+    the rows it is missing with its own catch-up read, then the shared batches.
+    """
+    def __init__(self, batch_rows: int = 10000, keep_alive: float = 15):
+        self.batch_rows = batch_rows # Maximum rows per read (a long backlog is read in several batches)
+        self.keep_alive = keep_alive # Seconds without rows before a "ping" event (keeps proxies from closing the stream)
+        self.tails = {} # (environment, proportioning) -> LiveTail
+
+    async def subscribe(self, db_connection, current_prop: int, query: str, after_dbid: int, interval: float) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Yield ("samples", DataFrame) with the logging rows after after_dbid as they arrive, ("ping", None) while there
+        are none, and a last ("end", None) when the proportioning finishes or ("error", message) if the poller fails.
+        """
+        key = (db_connection.name, current_prop)
+        tail = self.tails.get(key)
+        if tail is None:
+            tail = self.tails[key] = LiveTail(self, key, db_connection, current_prop, query, after_dbid)
+
+        queue = asyncio.Queue()
+        caught_up_to = tail.last_dbid # The shared batches from now on only have rows after this one
+        tail.add(queue, interval)
+        try:
+            last_dbid = after_dbid
+            if last_dbid < caught_up_to:
+                async for batch in self.read_after(db_connection, query, current_prop, last_dbid, caught_up_to):
+                    last_dbid = int(batch["logging_dbid"].iloc[-1])
+                    yield "samples", batch
+
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), timeout=self.keep_alive)
+                except asyncio.TimeoutError:
+                    yield "ping", None
+                    continue
+
+                if event == "samples":
+                    data = data[data["logging_dbid"] > last_dbid] # Already sent (subscribed ahead of the poller)
+                    if data.empty:
+                        continue
+                    last_dbid = int(data["logging_dbid"].iloc[-1])
+
+                yield event, data
+                if event != "samples":
+                    return
+        finally:
+            tail.remove(queue)
+
+    async def read_after(self, db_connection, query: str, current_prop: int, after_dbid: int, until_dbid: int = None) -> AsyncIterator[pd.DataFrame]:
+        # Logging rows after after_dbid (up to until_dbid), in batches of batch_rows
+        while until_dbid is None or after_dbid < until_dbid:
+            batch = await db_connection.fetch_df(query, current_prop, after_dbid=after_dbid, rows=self.batch_rows)
+            full = len(batch) == self.batch_rows
+            if until_dbid is not None:
+                batch = batch[batch["logging_dbid"] <= until_dbid]
+            if batch.empty:
+                return
+
+            after_dbid = int(batch["logging_dbid"].iloc[-1])
+            yield batch
+            if not full:
+                return
+
@@ -0,0 +1,36 @@
+from collections import deque
+from typing import Any, Dict
+import numpy as np
+
+class PoolMonitor:
+    """
+    Collects how long requests wait to get a connection from an engine pool (the checkout, including opening a new
+    connection when the pool grows) and how many gave up because the pool timeout expired.
+    The last `window` waits are kept to report percentiles, the totals cover the whole uptime.
+    """
+    def __init__(self, window: int = 1000):
+        self.waits = deque(maxlen=window) # Seconds of the last checkouts
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float):
+        self.waits.append(seconds)
+        self.checkouts += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+
+    def record_timeout(self):
+        self.timeouts += 1
+
+    def stats(self) -> Dict[str, Any]:
+        recent = np.array(self.waits) * 1000 # ms
+        return {
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.total_wait * 1000 / self.checkouts, 3) if self.checkouts else None,
+            "wait_p50_ms": round(float(np.percentile(recent, 50)), 3) if len(recent) else None,
+            "wait_p95_ms": round(float(np.percentile(recent, 95)), 3) if len(recent) else None,
+            "wait_max_ms": round(self.max_wait * 1000, 3),
+        }
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import pandas as pd
+from typing import Callable, Optional, Tuple
+
+class ProportioningCache:
+    """
+    Server-side copy of the latest `max_rows` proportionings of one environment, already calculated and formatted.
+    New proportionings are always appended with a higher proportioning_dbid, so a refresh only reads the rows above
+    the newest cached one plus the unfinished ones (no EndTime yet), whose values still change. The merged rows are
+    stamped with a revision (milliseconds, always increasing, also across restarts), so each client gets only the rows
+    that are new or changed since its last refresh (delta).
+    """
+    DELTA_CONDITION = "WHERE amadeus_proportioning.proportioning_dbid > :since_dbid OR amadeus_proportioning.proportioning_dbid = ANY(:pending)"
+
+    def __init__(self, max_rows: int):
+        self.max_rows = max_rows
+        self.rows = None # Formatted rows, ordered by ProportioningDBID DESC (None until the first refresh)
+        self.revisions = pd.Series(dtype="int64") # ProportioningDBID -> revision of its last change
+        self.pending = [] # ProportioningDBIDs of the cached rows that were unfinished in the last refresh
+        self.latest_dbid = 0
+        self.revision = 0
+        self.lock = asyncio.Lock() # One refresh at a time, concurrent requests reuse its result
+
+    async def refresh(self, db_connection, query: str, transform: Callable[[pd.DataFrame], pd.DataFrame]) -> int:
+        """
+        Read the new and the unfinished proportionings (everything on the first call), format them with transform
+        and merge them into the cached rows. Returns the revision of the cache.
+        """
+        async with self.lock:
+            if self.rows is None:
+                data = await db_connection.fetch_df(query=query.format(where_clause=""), rows=self.max_rows)
+            else:
+                data = await db_connection.fetch_df(query=query.format(where_clause=self.DELTA_CONDITION), rows=self.max_rows,
+                                                    since_dbid=self.latest_dbid, pending=self.pending)
+            self._merge(data, transform)
+            return self.revision
+
+    def _merge(self, data: pd.DataFrame, transform: Callable[[pd.DataFrame], pd.DataFrame]):
+        self.revision = max(self.revision + 1, int(time.time() * 1000))
+        dbids = data["ProportioningDBID"].astype("int64")
+        unfinished = set(dbids[data["EndTime"].isna()]) # Before transform, which turns EndTime into the duration
+
+        if self.rows is None:
+            rows = transform(data) if not data.empty else data
+        elif not data.empty:
+            # The fetched rows replace their old version (pending rows) and go on top of the rest
+            old = self.rows[~self.rows["ProportioningDBID"].isin(dbids)]
+            rows = pd.concat([transform(data), old], ignore_index=True)
+        else:
+            rows = self.rows
+
+        rows = rows.sort_values("ProportioningDBID", ascending=False, kind="stable").head(self.max_rows).reset_index(drop=True)
+        revisions = pd.concat([pd.Series(self.revision, index=dbids.to_numpy()), self.revisions[~self.revisions.index.isin(dbids)]])
+
+        self.rows = rows
+        self.revisions = revisions[revisions.index.isin(rows["ProportioningDBID"])]
+        self.pending = sorted(int(dbid) for dbid in unfinished if dbid in self.revisions.index) # Pending rows evicted from the window are not followed
+        self.latest_dbid = int(rows["ProportioningDBID"].iloc[0]) if not rows.empty else 0
+
+    def delta(self, since_dbid: int, since_revision: Optional[int] = None, rows: Optional[int] = None) -> Tuple[pd.DataFrame, bool]:
+        """
+        Rows newer than since_dbid plus the rows changed after since_revision (the revision of the client's last
+        refresh; without it, the rows that are still unfinished). Returns (rows, full): full is True when the client is
+        further behind than the cached window, then the latest `rows` rows are returned to replace its table.
+        """
+        dbids = self.rows["ProportioningDBID"]
+        if len(self.rows) >= self.max_rows and since_dbid < dbids.iloc[-1]:
+            return self.rows.head(rows), True
+
+        changed = self.revisions > since_revision if since_revision is not None else self.revisions.index.isin(self.pending)
+        changed_dbids = self.revisions.index[changed]
+        return self.rows[(dbids > since_dbid) | dbids.isin(changed_dbids)], False
+
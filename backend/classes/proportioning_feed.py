@@ -0,0 +1,50 @@
+import asyncio
+import pandas as pd
+from typing import Any, Dict
+from backend.database.query import query_proportioning_feed
+
+class ProportioningFeed:
+    """
+    Incremental reader of the finished proportionings of one environment, for the aggregates kept in memory
+    (DosingRollup...). Proportionings are appended with a higher proportioning_dbid, so every refresh only reads
+    the ones after the watermark (highest proportioning_dbid read) plus the pending ones (read while unfinished).
+    Each proportioning is passed to the consumers exactly once, when it has finished (its amounts are final).
+    """
+    def __init__(self, consumers: Dict[str, Any], batch_rows: int = 50000):
+        self.consumers = consumers # Name -> object with update(rows: DataFrame), called with every batch of finished proportionings
+        self.batch_rows = batch_rows # Maximum rows per read (the first refresh reads the whole history in several batches)
+        self.watermark = 0
+        self.pending = set() # Unfinished proportionings below the watermark
+        self.lock = asyncio.Lock() # One refresh at a time, concurrent requests wait for it and answer from its result
+
+    async def refresh(self, db_connection) -> int:
+        """
+        Read the new and the pending proportionings and pass the finished ones to the consumers.
+        Returns the number of proportionings consumed.
+        """
+        async with self.lock:
+            consumed = 0
+            pending = sorted(self.pending)
+            while True:
+                batch = await db_connection.fetch_df(query_proportioning_feed, since_dbid=self.watermark, pending=pending, rows=self.batch_rows)
+                consumed += self._consume(batch)
+                if len(batch) < self.batch_rows:
+                    return consumed
+                pending = [] # Already read in the first batch (they sort before the watermark)
+
+    def _consume(self, batch: pd.DataFrame) -> int:
+        if batch.empty:
+            return 0
+
+        dbids = batch["ProportioningDBID"].astype("int64")
+        finished = batch["EndTime"].notna()
+        self.pending.difference_update(dbids[finished].tolist())
+        self.pending.update(dbids[~finished].tolist())
+        self.watermark = max(self.watermark, int(dbids.max()))
+
+        rows = batch[finished]
+        if not rows.empty:
+            for consumer in self.consumers.values():
+                consumer.update(rows)
+        return len(rows)
+
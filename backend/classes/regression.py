@@ -0,0 +1,126 @@
+import asyncio
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+from backend.database.query import query_regressor_intermediates
+
+class LeastSquaresPolynomial:
+    """
+    Polynomial least squares fits of every degree up to max_degree from ONE QR factorization.
+    The Vandermonde matrix has the powers in increasing order [1, x, x², ...] (columns scaled to unit norm, as
+    np.polyfit does), so the fit of degree d only uses its first d + 1 columns: with V = QR, it is the solution of
+    R[:d+1, :d+1] · c = (Qᵀy)[:d+1]. The coefficients are the same as np.polyfit(x, y, d).
+    Only R and Qᵀy are kept (they hold the same information as XᵀX and Xᵀy, without squaring the condition number),
+    so new points are folded in with add() at the cost of the new points: QR of [R; V_new] and [Qᵀy; y_new].
+    Points with a non finite x or y (e.g. log10 of a zero flow) are left out.
+    """
+    def __init__(self, x: Iterable[float], y: Iterable[float], max_degree: int):
+        self.max_degree = max_degree
+        self.points = 0
+        self.scale = None # Column scale, from the first points added (kept, so R stays consistent)
+        self.r = np.zeros((0, max_degree + 1))
+        self.qty = np.zeros(0)
+        self.add(x, y)
+
+    def add(self, x: Iterable[float], y: Iterable[float]):
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        finite = np.isfinite(x) & np.isfinite(y)
+        x, y = x[finite], y[finite]
+        if len(x) == 0:
+            return
+
+        vandermonde = np.vander(x, self.max_degree + 1, increasing=True)
+        if self.scale is None:
+            self.scale = np.sqrt((vandermonde * vandermonde).sum(axis=0))
+            self.scale[self.scale == 0] = 1
+
+        q, self.r = np.linalg.qr(np.vstack([self.r, vandermonde / self.scale])) # Reduced QR: R has at most degree+1 rows
+        self.qty = q.T @ np.concatenate([self.qty, y])
+        self.points += len(x)
+
+    def coefficients(self, degree: int) -> np.ndarray:
+        """
+        Coefficients of the fit of `degree`, highest power first (same order as np.polyfit, for np.polyval).
+        """
+        if degree > self.max_degree:
+            raise ValueError(f"Degree {degree} is higher than the factorized degree {self.max_degree}")
+        if self.points == 0:
+            raise ValueError("No points to fit")
+
+        size = degree + 1
+        r = self.r[:size, :size]
+        if self.points < size or np.abs(np.diag(r)).min() <= np.finfo(float).eps * np.abs(r).max() * size:
+            # Rank deficient: minimum norm solution, as np.polyfit gives (with a RankWarning)
+            coefficients = np.linalg.lstsq(r, self.qty[:size], rcond=None)[0] / self.scale[:size]
+        else:
+            coefficients = np.linalg.solve(np.triu(r), self.qty[:size]) / self.scale[:size]
+        return coefficients[::-1]
+
+    def fit_degrees(self, degrees: Iterable[int]) -> Dict[int, np.ndarray]:
+        return {degree: self.coefficients(degree) for degree in degrees}
+
+class CoefficientCache:
+    """
+    LRU cache of regression coefficients (small dicts of arrays), bounded by the number of entries.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        value = self.entries.get(key)
+        if value is not None:
+            self.entries.move_to_end(key) # Most recently used
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False) # Least recently used
+
+class LotRegression:
+    """
+    Intermediates read so far of one lot and their incremental fit (log10(flow) -> opening, up to max_degree).
+    """
+    def __init__(self, max_degree: int):
+        self.rows = None # DataFrame with the intermediates (None until the first refresh)
+        self.last_dbid = 0 # Last intermediate_dbid read
+        self.regression = LeastSquaresPolynomial([], [], max_degree)
+        self.lock = asyncio.Lock() # One refresh of the lot at a time
+
+class LotRegressionStore:
+    """
+    Per (environment, lot) store of the Regressor intermediates and their LeastSquaresPolynomial. A lot keeps getting
+    intermediates during its lifetime: every refresh only reads the ones after the last intermediate_dbid read and
+    folds them into the fit, so refreshing a long-lived lot costs O(new points). The least recently used lots are
+    dropped beyond max_lots.
+    """
+    def __init__(self, max_lots: int, max_degree: int = 10):
+        self.max_lots = max_lots
+        self.max_degree = max_degree # Highest grade of the Regressor page, all the lower ones come from the same R
+        self.lots = OrderedDict() # (environment, lot_dbid) -> LotRegression
+
+    async def refresh(self, db_connection, lot_id: int) -> LotRegression:
+        key = (db_connection.name, lot_id)
+        lot = self.lots.get(key)
+        if lot is None:
+            lot = self.lots[key] = LotRegression(self.max_degree)
+            while len(self.lots) > self.max_lots:
+                self.lots.popitem(last=False) # Least recently used
+        self.lots.move_to_end(key)
+
+        async with lot.lock:
+            new = await db_connection.fetch_df(query_regressor_intermediates, current_lot=lot_id, after_dbid=lot.last_dbid)
+            if lot.rows is None:
+                lot.rows = new
+            elif not new.empty:
+                lot.rows = pd.concat([lot.rows, new], ignore_index=True)
+
+            if not new.empty:
+                lot.last_dbid = int(new["intermediate_dbid"].iloc[-1])
+                with np.errstate(divide="ignore", invalid="ignore"): # log10 of flow <= 0 is left out of the fit
+                    lot.regression.add(np.log10(new["flow"].to_numpy(dtype=float)), new["opening"].to_numpy(dtype=float))
+        return lot
@@ -1,8 +1,7 @@
 from typing import Optional
 from pydantic import BaseModel
 from fastapi import Request
-from backend.memory.state import session_data
-from backend.database.query import query_lot_db_id
+from backend.memory.state import session_data, proportioning_keys
 from backend.database.db_connections import ALL_DB_CONNECTIONS
 from backend.database.config import env_map, config
 
@@ -64,24 +63,21 @@ class RequestLotId(RequestBase):
         # Get current proportioning id for this user UID
         user_session = session_data.get(self.uid, {})
         current_prop = user_session.get("current_prop_id")
-        env_key= user_session.get("environment")
-        
-        if env_key is None or env_key not in ALL_DB_CONNECTIONS:
-            print(f"Environment (not) defined as {env_key},  using default configuration.")
-            env_key = "CONFIG"  # Default key for DB Connection
-            
-        # Collect the DBConnection object
-        db_connection = ALL_DB_CONNECTIONS[env_key]
-        
-        #Write the current_prop variable inside the query
-        query = query_lot_db_id.format(current_prop=current_prop)
-        lot_id = await db_connection.fetch_data(query)  #Save lot_id
-        data = lot_id[0]["lot_dbid"]    #Extract the lot_id
-
-        if lot_id is not None:
-            print("*"*69)
-            print(f"* UID {self.uid} requested lot id: {data:<7}*")
-            print("*"*69) # Debugging output  
+        environment = user_session.get("environment")
+        keys = user_session.get("proportioning_keys") #Resolved by /api/rowclicked together with current_prop_id
+
+        if not keys or keys["proportioning_dbid"] != current_prop or keys["environment"] != environment:
+            # Not resolved for this proportioning (e.g. the lookup failed when the row was clicked): resolve it now and keep it in the session
+            resolved = await resolve_proportioning_keys(connect_to_environment(environment), current_prop)
+            if resolved is None:
+                raise ValueError(f"No lot found for proportioning {current_prop}")
+            keys = {"proportioning_dbid": current_prop, "environment": environment, **resolved}
+            store_proportioning_keys(self.uid, keys)
+        data = keys["lot_dbid"]
+
+        print("*"*69)
+        print(f"* UID {self.uid} requested lot id: {data:<7}*")
+        print("*"*69) # Debugging output  
 
         return data
     
@@ -112,14 +108,7 @@ class RequestEnvironment(RequestBase):
     
     def ConnectToUserEnvironment(self):
         # Get configuration based on the user's environment
-        env_key  = self.return_data()
-        
-        if env_key is None or env_key not in ALL_DB_CONNECTIONS:
-            print(f"Environment (not) defined as {env_key},  using default configuration.")
-            env_key = "CONFIG"  # Default key for DB Connection
-        
-        # Initialize the DBConnection object with the selected environment
-        return  ALL_DB_CONNECTIONS[env_key]
+        return connect_to_environment(self.return_data())
     
 class RequestRows(RequestBase):
     """
@@ -138,4 +127,29 @@ class RequestRows(RequestBase):
         print(f"* UID {self.uid} requested rows: {rows:<15}*")
         print("*"*75)
 
-        return rows
\ No newline at end of file
+        return rows
+
+
+# ----------------- DB Connection of an environment (default configuration if it isn't defined) ----------------- #
+def connect_to_environment(env_key: Optional[str]):
+    if env_key is None or env_key not in ALL_DB_CONNECTIONS:
+        print(f"Environment (not) defined as {env_key},  using default configuration.")
+        env_key = "CONFIG"  # Default key for DB Connection
+
+    # Collect the DBConnection object of the selected environment
+    return ALL_DB_CONNECTIONS[env_key]
+
+# ----------------- Immutable keys of a proportioning (lot_dbid, article_dbid), from the environment-wide cache ----------------- #
+async def resolve_proportioning_keys(db_connection, current_prop: Optional[int]) -> Optional[dict]:
+    if current_prop is None:
+        return None
+    return await proportioning_keys.resolve(db_connection, current_prop)
+
+def store_proportioning_keys(uid: str, keys: dict):
+    """
+    Keep the keys in the session of the user, only if they belong to its current proportioning and environment: the
+    lookup is awaited, so another row may have been clicked (or the environment changed) in the meantime.
+    """
+    user_session = session_data.get(uid)
+    if user_session and user_session.get("current_prop_id") == keys["proportioning_dbid"] and user_session.get("environment") == keys["environment"]:
+        user_session["proportioning_keys"] = keys
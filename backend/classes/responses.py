@@ -0,0 +1,209 @@
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+import numpy as np
+import orjson
+import pandas as pd
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pandas.io.json import build_table_schema
+
+try:
+    import pyarrow as pa
+except ImportError: # Optional: only needed for the Arrow IPC stream format
+    pa = None
+
+COLUMNS_MEDIA_TYPE = "application/vnd.amalyzer.columns+json"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+TABLE_FORMATS = "^(records|columns|arrow)$" # Values of the format= query parameter of the table endpoints
+STREAM_FORMATS = "^(records|columns|arrow|ndjson)$" # Same, for the endpoints that can also stream the rows (ndjson_response)
+
+class DataFrameJSONResponse(Response):
+    """
+    JSON response for table endpoints. DataFrames are serialized with orjson from their columns (Series.tolist), without
+    FastAPI's jsonable_encoder walk. Floats are written with the shortest text that reads back the same value, like
+    json.dumps (DataFrame.to_json rounds them to a number of decimals).
+    The content can be a DataFrame (a list of records), a dict with DataFrames in its values (e.g. {"rows": df, ...})
+    or any other JSON content. The output is the same as returning df.to_dict(orient="records"), except that
+    NaN/NaT are sent as null (the standard JSON encoder refuses NaN).
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return self.to_json(content).encode("utf-8")
+
+    @classmethod
+    def to_json(cls, content: Any) -> str:
+        if isinstance(content, pd.DataFrame):
+            return cls.frame_json(content)
+        if isinstance(content, dict):
+            return "{" + ",".join(f"{json.dumps(str(key), ensure_ascii=False)}:{cls.to_json(value)}" for key, value in content.items()) + "}"
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+    @classmethod
+    def frame_json(cls, df: pd.DataFrame) -> str:
+        return dumps_json(frame_records(df))
+
+class ColumnarJSONResponse(DataFrameJSONResponse):
+    """
+    Same as DataFrameJSONResponse, but every DataFrame is sent by columns: {"schema": [{"name", "type"}], "columns": [[...], ...]},
+    the column names are written once instead of once per row (Table Schema types: integer, number, boolean, datetime, string...).
+    """
+    media_type = COLUMNS_MEDIA_TYPE
+
+    @classmethod
+    def frame_json(cls, df: pd.DataFrame) -> str:
+        df = unique_columns(df)
+        schema = json.dumps(table_schema_fields(df), ensure_ascii=False)
+        df = json_ready(df)
+        columns = dumps_json([df.iloc[:, position].tolist() for position in range(len(df.columns))])
+        return f'{{"schema":{schema},"columns":{columns}}}'
+
+class ArrowResponse(Response):
+    """
+    Arrow IPC stream of the table (typed columns, timestamps kept as timestamps), for bulk consumers (pandas/pyarrow/polars).
+    If the content is a dict (e.g. {"rows": df, "next_before_dbid": ...}), the DataFrame values are the stream and
+    the other values go to the schema metadata as JSON.
+    """
+    media_type = ARROW_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        metadata = {}
+        if isinstance(content, dict):
+            metadata = {str(key): json.dumps(jsonable_encoder(value)) for key, value in content.items() if not isinstance(value, pd.DataFrame)}
+            content = next(value for value in content.values() if isinstance(value, pd.DataFrame))
+
+        table = pa.Table.from_pandas(unique_columns(content), preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), **metadata})
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+TABLE_RESPONSES = {"records": DataFrameJSONResponse, "columns": ColumnarJSONResponse, "arrow": ArrowResponse}
+
+def negotiate_format(request: Request, format: Optional[str] = None) -> str:
+    """
+    Format asked with format= (records, columns, arrow, ndjson) or with the Accept header (application/vnd.amalyzer.columns+json,
+    application/vnd.apache.arrow.stream, application/x-ndjson). Records JSON is the default.
+    """
+    if format is not None:
+        return format
+
+    accept = request.headers.get("accept", "")
+    for format, media_type in (("arrow", ARROW_MEDIA_TYPE), ("columns", COLUMNS_MEDIA_TYPE), ("ndjson", NDJSON_MEDIA_TYPE)):
+        if media_type in accept:
+            return format
+    return "records"
+
+def table_response(request: Request, content: Any, format: Optional[str] = None) -> Response:
+    """
+    Response for a table endpoint in the negotiated format (see negotiate_format). NDJSON is only streamed by
+    ndjson_response, here it falls back to records.
+    """
+    format = negotiate_format(request, format)
+    if format not in TABLE_RESPONSES:
+        format = "records"
+
+    if format == "arrow" and pa is None:
+        return JSONResponse({"error": "Arrow format not available (pyarrow is not installed)"}, status_code=406)
+
+    return TABLE_RESPONSES[format](content)
+
+async def ndjson_response(chunks: AsyncIterator[pd.DataFrame], transform: Optional[Callable[[pd.DataFrame], pd.DataFrame]] = None) -> StreamingResponse:
+    """
+    Stream DataFrame chunks (e.g. DBConnection.stream_df) as NDJSON, one record per line, written chunk by chunk.
+    transform (calculations/formatting) is applied to every chunk. The first chunk is read before the response starts,
+    so query errors still reach the endpoint as exceptions.
+    """
+    def to_lines(chunk: pd.DataFrame) -> str:
+        chunk = transform(chunk) if transform else chunk
+        return "".join(f"{dumps_json(record)}\n" for record in frame_records(chunk))
+
+    try:
+        first = await anext(chunks, None)
+        first_lines = to_lines(first) if first is not None else ""
+    except BaseException:
+        await chunks.aclose() # The response never starts: close the server-side cursor and give the connection back now
+        raise
+
+    async def lines():
+        try:
+            yield first_lines
+            async for chunk in chunks:
+                yield to_lines(chunk)
+        finally:
+            await chunks.aclose() # Give the connection back to the pool if the client disconnects
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+
+def unique_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Same as to_dict: the last column with a name wins, in the position of the first one (e.g. SELECT * with JOIN)
+    if df.columns.is_unique:
+        return df
+    last = df.loc[:, ~df.columns.duplicated(keep="last")]
+    return last[df.columns[~df.columns.duplicated(keep="first")]]
+
+def table_schema_fields(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """
+    Table Schema fields of the columns (build_table_schema). Time zone aware columns are described here: pandas reads
+    tz.zone, which only pytz zones have (zoneinfo.ZoneInfo, as returned by psycopg, raises AttributeError).
+    """
+    time_zones = {position: dtype.tz for position, dtype in enumerate(df.dtypes) if isinstance(dtype, pd.DatetimeTZDtype)}
+    naive = df.copy(deep=False)
+    for position in time_zones:
+        naive.isetitem(position, df.iloc[:, position].dt.tz_localize(None))
+
+    fields = build_table_schema(naive, index=False, version=False)["fields"]
+    for position, tz in time_zones.items():
+        fields[position]["tz"] = str(tz)
+    return fields
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    # List of records (like df.to_dict(orient="records")), built from the converted columns
+    df = json_ready(unique_columns(df))
+    names = [str(column) for column in df.columns]
+    columns = [df.iloc[:, position].tolist() for position in range(len(names))]
+    return [dict(zip(names, row)) for row in zip(*columns)]
+
+def dumps_json(content: Any) -> str:
+    # orjson: round trip floats, NaN/inf as null
+    return orjson.dumps(content, default=json_default).decode("utf-8")
+
+def json_default(value: Any) -> Any:
+    # Values orjson doesn't serialize by itself (missing values of object columns, NumPy scalars, Decimal...)
+    if value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return jsonable_encoder(value)
+
+def json_ready(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert the columns that to_json would write differently from jsonable_encoder: datetimes (ISO text like
+    datetime.isoformat()), timedeltas (seconds) and date/time/Decimal objects.
+    """
+    converted = {}
+    for position, column in enumerate(df.columns):
+        values = df.iloc[:, position]
+
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            converted[column] = values.map(lambda value: value.isoformat(), na_action="ignore")
+
+        elif values.dtype.kind == "M":
+            # "YYYY-MM-DDTHH:MM:SS", with the microseconds only when there are
+            times = values.to_numpy()
+            has_fraction = times.astype("datetime64[us]") != times.astype("datetime64[s]")
+            text = np.where(has_fraction, np.datetime_as_string(times, unit="us"), np.datetime_as_string(times, unit="s")).astype(object)
+            text[np.isnat(times)] = None
+            converted[column] = text
+
+        elif values.dtype.kind == "m":
+            converted[column] = values.dt.total_seconds()
+
+        elif values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ("date", "time", "decimal"):
+            converted[column] = values.map(lambda value: float(value) if pd.api.types.is_number(value) else value.isoformat(), na_action="ignore")
+
+    return df.assign(**converted) if converted else df # New frame, the cached/shared frames are not modified
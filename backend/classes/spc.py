@@ -0,0 +1,131 @@
+import math
+import numpy as np
+import pandas as pd
+from collections import deque
+from typing import Any, Dict, Optional
+from backend.classes.calculation import CalculateProportioningMetrics
+
+class ControlChart:
+    """
+    Incremental control chart state of one article at one dosing location, on the deviation % of its dosings
+    (NumericDeviationPercent, target 0 %). Every new value updates in O(1):
+        - EWMA: z = λ·x + (1 - λ)·z, with the exact limits ± L·σ·sqrt(λ / (2 - λ) · (1 - (1 - λ)^(2n)))
+        - Tabular CUSUM: C+ = max(0, x - k·σ + C+), C- = max(0, -x - k·σ + C-), signal above h·σ
+        - Variance of the last `window` values (running sums)
+    σ is estimated from the first `baseline` values (Welford) and then kept, so a drift doesn't widen its own
+    limits; no signals are given before. The last `history` points are kept for the chart.
+    """
+    def __init__(self, lambda_: float, L: float, k: float, h: float, window: int, baseline: int, history: int):
+        self.lambda_ = lambda_
+        self.L = L
+        self.k = k
+        self.h = h
+        self.baseline = baseline
+        self.n = 0
+        self.mean = 0.0 # Welford estimate of the baseline (first `baseline` values)
+        self.m2 = 0.0
+        self.sigma = None # Fixed once the baseline is complete
+        self.ewma = 0.0
+        self.cusum_pos = 0.0
+        self.cusum_neg = 0.0
+        self.window = deque(maxlen=window)
+        self.window_sum = 0.0
+        self.window_sumsq = 0.0
+        self.history = deque(maxlen=history)
+
+    def add(self, dbid: int, start_time, value: float):
+        self.n += 1
+
+        if self.sigma is None:
+            delta = value - self.mean
+            self.mean += delta / self.n
+            self.m2 += delta * (value - self.mean)
+            if self.n >= self.baseline:
+                self.sigma = math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+                self.cusum_pos = self.cusum_neg = 0.0 # Start accumulating with the final σ
+        sigma = self.sigma if self.sigma is not None else (math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0)
+
+        # Rolling variance (running sums of the window)
+        if len(self.window) == self.window.maxlen:
+            old = self.window[0]
+            self.window_sum -= old
+            self.window_sumsq -= old * old
+        self.window.append(value)
+        self.window_sum += value
+        self.window_sumsq += value * value
+        count = len(self.window)
+        rolling_var = max((self.window_sumsq - self.window_sum ** 2 / count) / (count - 1), 0.0) if count > 1 else 0.0
+
+        self.ewma = self.lambda_ * value + (1 - self.lambda_) * self.ewma
+        ewma_limit = self.L * sigma * math.sqrt(self.lambda_ / (2 - self.lambda_) * (1 - (1 - self.lambda_) ** (2 * self.n)))
+
+        self.cusum_pos = max(0.0, value - self.k * sigma + self.cusum_pos)
+        self.cusum_neg = max(0.0, -value - self.k * sigma + self.cusum_neg)
+        cusum_limit = self.h * sigma
+
+        active = self.sigma is not None
+        ewma_signal = active and abs(self.ewma) > ewma_limit
+        cusum_signal = active and (self.cusum_pos > cusum_limit or self.cusum_neg > cusum_limit)
+
+        self.history.append((self.n, dbid, start_time, value, self.ewma, ewma_limit, self.cusum_pos, self.cusum_neg,
+                             cusum_limit, math.sqrt(rolling_var), ewma_signal, cusum_signal))
+
+    def points(self) -> pd.DataFrame:
+        return pd.DataFrame(list(self.history), columns=["Sample", "ProportioningDBID", "StartTime", "DeviationPercent", "EWMA", "EWMALimit",
+                                                         "CUSUMPos", "CUSUMNeg", "CUSUMLimit", "RollingStd", "EWMASignal", "CUSUMSignal"])
+
+    def status(self) -> Dict[str, Any]:
+        last = self.history[-1] if self.history else None
+        return {
+            "Samples": self.n,
+            "Sigma": self.sigma,
+            "EWMA": self.ewma,
+            "CUSUMPos": self.cusum_pos,
+            "CUSUMNeg": self.cusum_neg,
+            "RollingStd": last[9] if last else None,
+            "EWMASignal": bool(last[10]) if last else False,
+            "CUSUMSignal": bool(last[11]) if last else False,
+            "LastProportioningDBID": last[1] if last else None,
+        }
+
+class SPCEngine:
+    """
+    Statistical process control of the dosing accuracy: one ControlChart per (ArticleDBID, DosingLocation), updated
+    with every batch of finished proportionings (ProportioningFeed), so the statistics are never recomputed over the
+    history. Deviation % as in the proportionings table (NumericDeviation); "Fill the box" dosings and non finite
+    deviations are skipped.
+    """
+    def __init__(self, lambda_: float = 0.2, L: float = 3.0, k: float = 0.5, h: float = 5.0, window: int = 50, baseline: int = 30, history: int = 1000):
+        self.settings = dict(lambda_=lambda_, L=L, k=k, h=h, window=window, baseline=baseline, history=history)
+        self.charts = {} # (ArticleDBID, DosingLocation) -> ControlChart
+        self.article_names = {} # ArticleDBID -> ArticleName (last name read)
+
+    def update(self, rows: pd.DataFrame):
+        requested = pd.to_numeric(rows["Requested"], errors="coerce")
+        actual = pd.to_numeric(rows["Actual"], errors="coerce")
+        _, deviation_percent = CalculateProportioningMetrics.numeric_deviations(requested, actual)
+        measured = (requested.to_numpy() >= 0) & np.isfinite(deviation_percent.to_numpy(dtype=float))
+
+        rows = rows.assign(DeviationPercent=deviation_percent.astype(float), DosingLocation=rows["DosingLocation"].fillna(0))[measured]
+        for article, location, dbid, start_time, value in zip(rows["ArticleDBID"].tolist(), rows["DosingLocation"].astype("int64").tolist(),
+                                                              rows["ProportioningDBID"].tolist(), rows["StartTime"].tolist(), rows["DeviationPercent"].tolist()):
+            chart = self.charts.get((article, location))
+            if chart is None:
+                chart = self.charts[(article, location)] = ControlChart(**self.settings)
+            chart.add(dbid, start_time, value)
+
+        self.article_names.update(zip(rows["ArticleDBID"].tolist(), rows["ArticleName"].tolist()))
+
+    def chart(self, article_dbid: int, location: int) -> Optional[ControlChart]:
+        return self.charts.get((article_dbid, location))
+
+    def summary(self, signals_only: bool = False) -> pd.DataFrame:
+        # Current state of every chart (one row per article and location)
+        rows = [{"ArticleDBID": article, "ArticleName": self.article_names.get(article), "DosingLocation": location, **chart.status()}
+                for (article, location), chart in sorted(self.charts.items())]
+        summary = pd.DataFrame(rows, columns=["ArticleDBID", "ArticleName", "DosingLocation", "Samples", "Sigma", "EWMA", "CUSUMPos", "CUSUMNeg",
+                                              "RollingStd", "EWMASignal", "CUSUMSignal", "LastProportioningDBID"])
+        if signals_only:
+            summary = summary[summary["EWMASignal"] | summary["CUSUMSignal"]]
+        return summary
+
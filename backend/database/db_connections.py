@@ -3,6 +3,6 @@ from backend.classes.db_connection import DBConnection
 
 
 ALL_DB_CONNECTIONS = {
-    env_name: DBConnection(config) for env_name, config in env_map.items()
+    env_name: DBConnection(config, name=env_name) for env_name, config in env_map.items()
 }
 
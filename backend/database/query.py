@@ -1,3 +1,5 @@
+# Queries use bound parameters (:current_prop, :current_lot, :rows...), DBConnection sends their values apart from the SQL.
+# {where_clause} only takes SQL conditions written in the code (with their own :parameters), never user values.
 # SQL query to fetch proportioning data
 query_proportionings= """
 SELECT 
@@ -23,8 +25,16 @@ JOIN amadeus_proportioningrecord ON amadeus_proportioning.proportioning_dbid = a
 JOIN amadeus_loggingparam ON amadeus_proportioning.proportioning_dbid = amadeus_loggingparam.proportioning_dbid 
 JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
 JOIN amadeus_lot ON amadeus_proportioning.lot_dbid = amadeus_lot.lot_dbid
+{where_clause}
 ORDER BY amadeus_proportioning.proportioning_dbid DESC
-LIMIT {rows};"""
+LIMIT :rows;"""
+# SQL expression that classifies the deviation of a proportioning, same as IsInTolerance (1 = Over Tolerance, 2 = Within Tolerance, 3 = Under Tolerance, 4 = Requested Negative)
+sql_deviation = """CASE
+        WHEN amadeus_proportioningrecord.requestedamount < 0 THEN 4
+        WHEN amadeus_proportioningrecord.actualamount < amadeus_proportioningrecord.requestedamount * (1 - amadeus_proportioningrecord.requiredtolerance / 100.0) THEN 3
+        WHEN amadeus_proportioningrecord.actualamount > amadeus_proportioningrecord.requestedamount * (1 + amadeus_proportioningrecord.requiredtolerance / 100.0) THEN 1
+        ELSE 2
+    END"""
 # SQL query to fetch proportioning FILTER data
 query_proportionings_filter= """
 SELECT 
@@ -52,9 +62,9 @@ JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.art
 JOIN amadeus_lot ON amadeus_proportioning.lot_dbid = amadeus_lot.lot_dbid
 {where_clause}
 ORDER BY amadeus_proportioning.proportioning_dbid DESC
-LIMIT {rows};"""
+LIMIT :rows;"""
 
-#SQL query to fetch ArticleList (ProportioningDbId and LIMIT {rows} are added to be sure that the query is fetch the same data that is shown in the proportonings table (fetched with query_proportionings))
+#SQL query to fetch ArticleList (ProportioningDbId and LIMIT :rows are added to be sure that the query is fetch the same data that is shown in the proportonings table (fetched with query_proportionings))
 query_article_list = """SELECT 
     amadeus_proportioning.proportioning_dbid AS "ProportioningDBID",
     amadeus_proportioning.article_dbid AS "ArticleDBID", 
@@ -62,7 +72,7 @@ query_article_list = """SELECT
 FROM amadeus_proportioning 
 JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
 ORDER BY amadeus_proportioning.proportioning_dbid DESC
-LIMIT {rows}; 
+LIMIT :rows; 
 """
 # SQL query to fetch Analyzer Summary data
 query_analyzer_summary = """
@@ -86,7 +96,7 @@ JOIN amadeus_proportioningrecord ON amadeus_proportioning.proportioning_dbid = a
 JOIN amadeus_loggingparam ON amadeus_proportioning.proportioning_dbid = amadeus_loggingparam.proportioning_dbid 
 JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
 JOIN amadeus_lot ON amadeus_proportioning.lot_dbid = amadeus_lot.lot_dbid
-WHERE amadeus_proportioning.proportioning_dbid = {current_prop};
+WHERE amadeus_proportioning.proportioning_dbid = :current_prop;
 """
 # SQL query, Valuable information about the PropID
 query_valuable_information = """
@@ -96,19 +106,19 @@ SELECT
 FROM amadeus_proportioning 
 JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
 JOIN amadeus_lot ON amadeus_proportioning.lot_dbid = amadeus_lot.lot_dbid
-WHERE amadeus_proportioning.proportioning_dbid = {current_prop};
+WHERE amadeus_proportioning.proportioning_dbid = :current_prop;
 """
 # SQL query to fetch Analyzer PropRecord data
 query_analyzer_propRecord = """
 SELECT * FROM public.amadeus_proportioningrecord
 JOIN public.amadeus_proportioning ON amadeus_proportioning.proportioning_dbid = amadeus_proportioningrecord.proportioning_dbid
-WHERE amadeus_proportioning.proportioning_dbid = {current_prop};
+WHERE amadeus_proportioning.proportioning_dbid = :current_prop;
 """
 # SQL query to fetch Analyzer LogginParam data
 query_analyzer_logginParam = """
 SELECT * FROM public.amadeus_loggingparam
 JOIN public.amadeus_proportioning ON amadeus_loggingparam.proportioning_dbid = amadeus_proportioning.proportioning_dbid
-WHERE amadeus_proportioning.proportioning_dbid = {current_prop};
+WHERE amadeus_proportioning.proportioning_dbid = :current_prop;
 """
 # SQL query to fetch Analyzer Lot data
 query_analyzer_lot = """
@@ -117,7 +127,7 @@ FROM public.amadeus_lot
 WHERE lot_dbid = (
     SELECT lot_dbid 
     FROM public.amadeus_proportioning 
-    WHERE proportioning_dbid = {current_prop});
+    WHERE proportioning_dbid = :current_prop);
 
 """
 
@@ -128,60 +138,103 @@ FROM public.amadeus_article
 WHERE article_dbid = (
     SELECT article_dbid 
     FROM public.amadeus_proportioning 
-    WHERE proportioning_dbid = {current_prop});
+    WHERE proportioning_dbid = :current_prop);
 """
 
-#SQL query to fetch Analyzer Graph
-query_analyzer_slide_graph= """
+#SQL query to know if a proportioning has finished (its logging rows won't change anymore)
+query_proportioning_finished = """
+SELECT end_time IS NOT NULL AS "Finished"
+    FROM public.amadeus_proportioningrecord
+WHERE proportioning_dbid = :current_prop;
+"""
+#SQL query to read the proportionings incrementally for the aggregates (ProportioningFeed: the ones after the watermark plus the pending unfinished ones)
+query_proportioning_feed = """
 SELECT 
-    plant_out_slideposition, dc_out_desiredslideposition, dc_out_controlvibrator, dc_out_controlknocker 
-    FROM 
-    amadeus_logging WHERE proportioning_dbid =  {current_prop} ;
+    amadeus_proportioning.proportioning_dbid AS "ProportioningDBID",
+    amadeus_proportioning.article_dbid AS "ArticleDBID",
+    amadeus_article.name AS "ArticleName",
+    amadeus_proportioningrecord.proportioninglocation AS "DosingLocation", 
+    amadeus_loggingparam.if_in_typeofdosing AS "TypeOfDosing", 
+    amadeus_proportioningrecord.requestedamount AS "Requested", 
+    amadeus_proportioningrecord.actualamount AS "Actual",
+    amadeus_proportioningrecord.requiredtolerance AS "Tolerance", 
+    amadeus_proportioningrecord.start_time AS "StartTime", 
+    amadeus_proportioningrecord.end_time AS "EndTime"
+FROM amadeus_proportioning 
+JOIN amadeus_proportioningrecord ON amadeus_proportioning.proportioning_dbid = amadeus_proportioningrecord.proportioning_dbid 
+JOIN amadeus_loggingparam ON amadeus_proportioning.proportioning_dbid = amadeus_loggingparam.proportioning_dbid 
+JOIN amadeus_article ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
+WHERE amadeus_proportioning.proportioning_dbid > :since_dbid OR amadeus_proportioning.proportioning_dbid = ANY(:pending)
+ORDER BY amadeus_proportioning.proportioning_dbid ASC
+LIMIT :rows;
 """
-#SQl query to fetch Analyzer Graph2 (Dosed Material)
-query_analyzer_dosed_material= """
+#SQL query to fetch Analyzer Graphs (Slide Position, Dosed Material and Flow share this single read of amadeus_logging)
+query_analyzer_logging= """
 SELECT 
-    if_out_dosedweight
+    plant_out_slideposition, dc_out_desiredslideposition, dc_out_controlvibrator, dc_out_controlknocker,
+    if_out_dosedweight,
+    dc_out_desiredflow, dc_out_expectedflow, f_out_filteredflow2 
     FROM 
-    amadeus_logging WHERE proportioning_dbid =  {current_prop} ;
+    amadeus_logging WHERE proportioning_dbid =  :current_prop
+ORDER BY logging_dbid ASC;
 """
-#SQL query to fetch Analyzer Graph3 (Flow)
-query_analyzer_flow= """
+#SQL query to fetch the new logging rows of a running proportioning (Live tail: only the rows after the last logging_dbid read)
+query_analyzer_logging_tail= """
 SELECT 
-    dc_out_desiredflow,dc_out_expectedflow, f_out_filteredflow2 
+    logging_dbid,
+    plant_out_slideposition, dc_out_desiredslideposition, dc_out_controlvibrator, dc_out_controlknocker,
+    if_out_dosedweight,
+    dc_out_desiredflow, dc_out_expectedflow, f_out_filteredflow2 
     FROM 
-    amadeus_logging WHERE proportioning_dbid =  {current_prop} ;
+    amadeus_logging WHERE proportioning_dbid = :current_prop AND logging_dbid > :after_dbid
+ORDER BY logging_dbid ASC
+LIMIT :rows;
 """
-#SQL query to fetch Regressor Graph
-query_regressor_graph = """
+#SQL query to fetch the intermediates of a lot after the last one already read (Regressor fits, LotRegressionStore)
+query_regressor_intermediates = """
 SELECT intermediate_dbid, measurement_time, flow, opening
 FROM public.amadeus_intermediates
-WHERE lot_dbid = {current_lot};
+WHERE lot_dbid = :current_lot AND intermediate_dbid > :after_dbid
+ORDER BY intermediate_dbid ASC;
 """
 
-#SQL query to request lot db id from a proportioning db id
-query_lot_db_id = """
-SELECT lot_dbid FROM public.amadeus_proportioning
-WHERE proportioning_dbid = {current_prop};
+#SQL query to request the immutable keys (lot db id, article db id) of a proportioning db id
+query_proportioning_keys = """
+SELECT lot_dbid, article_dbid FROM public.amadeus_proportioning
+WHERE proportioning_dbid = :current_prop;
+"""
+#SQL query to request the Regression table of a lot, with its intermediate count
+query_regressor_lot_summary = """
+SELECT lot_id, lot_dbid, c2_in_flowtablequality, c2_in_measureddensity, c2_in_angleofrepose,c2_in_oscillationfactor,
+    c2_in_oscillationmin ,c2_in_oscillationspeed, c1_in_minflow, c1_in_maxflow,
+    (SELECT COUNT(*) FROM public.amadeus_intermediates WHERE amadeus_intermediates.lot_dbid = amadeus_lot.lot_dbid) AS "IntermediateCount"
+    FROM public.amadeus_lot
+WHERE lot_dbid = :current_lot
+"""
+#SQL query to fetch the intermediates of every lot at once, sorted by lot (fleet-wide Regressor fits, FleetRegression)
+query_fleet_intermediates = """
+SELECT lot_dbid, flow, opening
+FROM public.amadeus_intermediates
+ORDER BY lot_dbid ASC, intermediate_dbid ASC;
 """
-#SQL query to request Regression table
-query_regression_table = """
+#SQL query to request the Regression table of every lot (same columns as query_regressor_lot_summary)
+query_fleet_lots = """
 SELECT lot_id, lot_dbid, c2_in_flowtablequality, c2_in_measureddensity, c2_in_angleofrepose,c2_in_oscillationfactor,
     c2_in_oscillationmin ,c2_in_oscillationspeed, c1_in_minflow, c1_in_maxflow 
     FROM public.amadeus_lot
-WHERE lot_dbid = {current_lot}
+ORDER BY lot_dbid ASC;
 """
 #SQL query to request VMS data
 query_vms_data = """
 SELECT proportioning_dbid, sensor_l, sensor_m, sensor_r 
     FROM public.amadeus_vms_logging
-	where proportioning_dbid = 	{current_prop}
+	where proportioning_dbid = 	:current_prop
 	ORDER BY vms_logging_dbid ASC
 """
 query_vms_parameters = """
 SELECT offset_l_x, offset_l_y, offset_m_x, offset_m_y, offset_r_x, offset_r_y  
     FROM public.amadeus_vms_param
-    where proportioning_dbid = {current_prop}
+    where proportioning_dbid = :current_prop
 """
 query_vms_summary_table = """
 SELECT 
@@ -198,5 +251,5 @@ JOIN amadeus_article
     ON amadeus_proportioning.article_dbid = amadeus_article.article_dbid 
 JOIN amadeus_lot 
     ON amadeus_proportioning.lot_dbid = amadeus_lot.lot_dbid
-WHERE amadeus_proportioning.proportioning_dbid = {current_prop};
-"""
\ No newline at end of file
+WHERE amadeus_proportioning.proportioning_dbid = :current_prop;
+"""
\ No newline at end of file
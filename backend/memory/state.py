@@ -1,2 +1,41 @@
+from collections import defaultdict
+from backend.classes.frame_cache import FrameCache
+from backend.classes.proportioning_cache import ProportioningCache
+from backend.classes.live_tail import LiveTailHub
+from backend.classes.proportioning_feed import ProportioningFeed
+from backend.classes.dosing_rollup import DosingRollup
+from backend.classes.spc import SPCEngine
+from backend.classes.regression import CoefficientCache, LotRegressionStore
+from backend.classes.fleet_regression import FleetRegression
+from backend.classes.id_mapping import ProportioningKeyCache
+
 # We use a dictionary to store the propDbId per session (temporarily in memory).
-session_data = {}
\ No newline at end of file
+session_data = {}
+
+# In-process cache of per-proportioning/per-lot logging frames (shared by all users and environments).
+# Bounded by the memory of the cached DataFrames, frames that can still change expire after `ttl` seconds.
+frame_cache = FrameCache(max_bytes=512 * 1024 * 1024, ttl=10)
+
+# Latest proportionings of every environment (env key -> ProportioningCache), refreshed incrementally by the Update button.
+proportioning_caches = defaultdict(lambda: ProportioningCache(max_rows=5000))
+
+# Shared pollers of the running proportionings (one per environment and proportioning), for /analyzer/LiveTail.
+live_tails = LiveTailHub()
+
+# Finished proportionings of every environment (env key -> ProportioningFeed), read incrementally into the aggregates.
+def new_proportioning_feed() -> ProportioningFeed:
+    return ProportioningFeed(consumers={"rollup": DosingRollup(), "spc": SPCEngine()})
+
+proportioning_feeds = defaultdict(new_proportioning_feed)
+
+# Regression coefficients of the Regressor graph, per (environment, lot, intermediate count, grades) (LRU, the bins only change the evaluation).
+regression_cache = CoefficientCache(max_entries=256)
+
+# Intermediates and incremental fits of the Regressor lots, per (environment, lot) (only the new intermediates are read).
+regression_store = LotRegressionStore(max_lots=64)
+
+# Fleet-wide Regressor fits of every lot, per environment (last batch run, computed on a process pool).
+fleet_regression = FleetRegression()
+
+# Immutable keys of the proportionings (lot_dbid, article_dbid), per (environment, proportioning), resolved once for every session.
+proportioning_keys = ProportioningKeyCache(max_entries=100000)
@@ -1,7 +1,7 @@
 # backend/router.py
 from fastapi import APIRouter
 # Import routers from each module in the routes folder
-from backend.routes import proportionings, analyzer, regressor, vms, common, settings
+from backend.routes import proportionings, analyzer, regressor, vms, common, settings, kpis, spc
 
 # Create a global APIRouter instance
 router = APIRouter()
@@ -13,3 +13,5 @@ router.include_router(common.router)           #  "Include routes from common mo
 router.include_router(regressor.router)        #  "Include routes from regressor module"
 router.include_router(vms.router)              #  "Include routes from vms module"
 router.include_router(settings.router)         #  "Include routes from settings module"
+router.include_router(kpis.router)             #  "Include routes from kpis module"
+router.include_router(spc.router)              #  "Include routes from spc module"
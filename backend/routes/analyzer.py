@@ -1,145 +1,158 @@
+import asyncio
+import json
+import numpy as np
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse
+from fastapi import Query, Header
+from typing import Optional
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 from backend.classes.graphs import PlotPointsinTime, TraceData
 from backend.classes.request import RequestPropId, RequestEnvironment
-from backend.classes.calculation import CaclulateDateDelta, CaclulatPercent , IsInTolerance , NumericDeviation
+from backend.classes.calculation import CalculateProportioningMetrics
 from backend.classes.filter_data import Deviation , DosingType
-from backend.database.query import query_analyzer_summary, query_analyzer_propRecord, query_analyzer_logginParam, query_analyzer_lot, query_analyzer_article, query_analyzer_slide_graph, query_analyzer_flow, query_analyzer_dosed_material
+from backend.classes.responses import table_response, negotiate_format, ndjson_response, ColumnarJSONResponse, TABLE_FORMATS, STREAM_FORMATS
+from backend.memory.state import live_tails
+from backend.database.query import query_analyzer_summary, query_analyzer_propRecord, query_analyzer_logginParam, query_analyzer_lot, query_analyzer_article, query_analyzer_logging, query_analyzer_logging_tail
 
 router = APIRouter(prefix="/analyzer")  
 
 # ---------- Generate and return interactive graph SLIDE POSITION  ---------- #
 @router.get("/Graph1", response_class=HTMLResponse)
-async def generate_graph(request: Request):
+async def generate_graph(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
     try:
-        # Connect to the user's environment
-        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-
-        # Get the current proportioning ID from the request cookies
-        current_prop = get_current_prop_id(request) 
-        # Fetch data from the database
-        df = await db_connection.fetch_df(query=query_analyzer_slide_graph, current_prop=current_prop)
-
-        debug(current_prop, "Slide Position") # Debugging by console
-
-        #Generate an empty list for traces
-        trace_list = []
-        #Generate TraceData object and append it
-        trace_list.append(TraceData(label="Vibratos",  sample_time=0.01, x_data=df.index,  y_data=[5 if y else -10 for y in df["dc_out_controlvibrator"]], mode="markers", color="grey"))
-        trace_list.append(TraceData(label="Knocer",  sample_time=0.01, x_data=df.index,  y_data=[2.5 if y else -10 for y in df["dc_out_controlknocker"]], mode="markers", color="purple"))
-        trace_list.append(TraceData(label="Desired Position",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_desiredslideposition"], mode="lines", color="pink"))
-        trace_list.append(TraceData(label="Real Time Position",  sample_time=0.01, x_data=df.index,  y_data=df["plant_out_slideposition"], mode="lines", color="blue"))
-
-        
-        graph_html = PlotPointsinTime( 
-            title="Slide Position", 
-            xaxis_title="Seconds", 
-            yaxis_title="mm", 
-            traces=trace_list,
-            leyend_pos=["top", "right"]
-        ).plot_graph()
-
+        graph = await build_slide_position_graph(request, maxPoints)
         # Return raw HTML
-        return graph_html
+        return graph.plot_graph()
 
     except Exception as e:
         print(f"Error: {e}")
         # Aquí podrías devolver un HTML de error, o un JSON si prefieres
         return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+
+@router.get("/Graph1Figure")
+async def generate_graph_figure(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
+    try:
+        graph = await build_slide_position_graph(request, maxPoints)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
     
 
 # ---------- Generate and return interactive graph  DOSED MATERIAL---------- #
 @router.get("/Graph2", response_class=HTMLResponse)
-async def generate_graph(request: Request):
+async def generate_graph(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
     try:
-        # Connect to the user's environment
-        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-
-        # Get the current proportioning ID from the request cookies
-        current_prop = get_current_prop_id(request) 
-        # Fetch data from the database
-        df = await db_connection.fetch_df(query=query_analyzer_dosed_material, current_prop=current_prop)
-
-        debug(current_prop,"Dosed Material") # Debugging by console
-
-        summary = await db_connection.fetch_df(query_analyzer_summary, current_prop=current_prop)
-
-        requested = float(summary["Requested"].iloc[0])
-        tolerance = float(summary["Tolerance"].iloc[0]) / 100
-        upper_tolerance = requested * (1 + tolerance)
-        lower_tolerance = requested * (1 - tolerance)
-
-
-        trace_list = []
-        #Smoothed filter for erasing small variations
-        df['Smoothed'] = df["if_out_dosedweight"].rolling(window=100).mean().fillna(0) #0.1 seconds
-
-        #Generate TraceData object
-        trace_list.append(TraceData(label="Smoothed Dosed Material",  sample_time=0.01, x_data=df.index,  y_data=df["Smoothed"], mode="lines", color="grey")) 
-        trace_list.append(TraceData(label="Dosed Material",  sample_time=0.01, x_data=df.index,  y_data=df["if_out_dosedweight"], mode="lines", color="red"))
-        trace_list.append(TraceData(label="Set Point",  sample_time=0.01, x_data=df.index,  y_data=[requested] * len(df.index), mode="lines", color="Blue")) #Setpoint
-        trace_list.append(TraceData(label="Upper Tolerance",  sample_time=0.01, x_data=df.index,  y_data=[upper_tolerance] * len(df.index), mode="lines", color="Green", dash="dash"))
-        trace_list.append(TraceData(label="Lower Tolerance",  sample_time=0.01, x_data=df.index,  y_data=[lower_tolerance] * len(df.index), mode="lines", color="Green", dash="dash"))
-
-        graph_html = PlotPointsinTime(
-            title="Dosed Material", 
-            xaxis_title="Seconds", 
-            yaxis_title="kg", 
-           traces=trace_list,
-           leyend_pos=["bottom", "right"]
-        ).plot_graph()
-
+        graph = await build_dosed_material_graph(request, maxPoints)
         # Return raw HTML
-        return graph_html
+        return graph.plot_graph()
 
     except Exception as e:
         print(f"Error: {e}")
         # Aquí podrías devolver un HTML de error, o un JSON si prefieres
         return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
 
-# ---------- Generate and return interactive graph SLIDE POSITION  ---------- #
-@router.get("/Graph3", response_class=HTMLResponse)
-async def generate_graph(request: Request):
+@router.get("/Graph2Figure")
+async def generate_graph_figure(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
     try:
-        # Connect to the user's environment
-        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+        graph = await build_dosed_material_graph(request, maxPoints)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
 
-        # Get the current proportioning ID from the request cookies
-        current_prop = get_current_prop_id(request) 
-        # Fetch data from the database
-        df = await db_connection.fetch_df(query=query_analyzer_flow, current_prop=current_prop)
-
-        debug(current_prop, "Material Flow") # Debugging by console
-
-        #Generate an empty list for traces
-        trace_list = []
-        #Generate TraceData object and append it
-        trace_list.append(TraceData(label="Expected Flow",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_expectedflow"], mode="lines", color="blue"))
-        trace_list.append(TraceData(label="Desired Flow",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_desiredflow"], mode="lines", color="pink",  dash="dash"))
-        trace_list.append(TraceData(label="Actual Flow",  sample_time=0.01, x_data=df.index,  y_data=df["f_out_filteredflow2"], mode="lines", color="green"))
-        
-        graph_html = PlotPointsinTime( 
-            title="Material Flow", 
-            xaxis_title="Seconds", 
-            yaxis_title="Kg/s", 
-            traces=trace_list,
-            leyend_pos=["top", "right"]
-        ).plot_graph()
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
 
+# ---------- Generate and return interactive graph MATERIAL FLOW  ---------- #
+@router.get("/Graph3", response_class=HTMLResponse)
+async def generate_graph(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
+    try:
+        graph = await build_material_flow_graph(request, maxPoints)
         # Return raw HTML
-        return graph_html
+        return graph.plot_graph()
 
     except Exception as e:
         print(f"Error: {e}")
         return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+
+@router.get("/Graph3Figure")
+async def generate_graph_figure(
+    request: Request,
+    maxPoints: int = Query(5000) #Maximum points per trace sent to the browser (LTTB downsampling, 0 = all points)
+):
+    try:
+        graph = await build_material_flow_graph(request, maxPoints)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
     
 
+# ---------- LIVE TAIL of the running proportioning (Server-Sent Events) ---------- #
+@router.get("/LiveTail")
+async def live_tail(
+    request: Request,
+    after: Optional[int] = Query(None), #Last logging_dbid already shown (default: from the first sample of the proportioning)
+    interval: float = Query(1.0, ge=0.1, le=60), #Seconds between polls (the shared poller uses the shortest one of its subscribers)
+    last_event_id: Optional[int] = Header(None) #Sent by EventSource when it reconnects (the id of the last event received)
+):
+    """
+    Stream the new logging rows of the current proportioning as they are written (text/event-stream).
+    "samples" events carry {"schema", "columns"} (same as format=columns) with logging_dbid and the graph signals, and their
+    id is the last logging_dbid sent. "ping" events keep the connection open, "end" is sent when the proportioning finishes.
+    One database poller per proportioning is shared by all its subscribers, each poll only reads the rows after the last one read.
+    """
+    try:
+        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+        current_prop = get_current_prop_id(request)
+        if current_prop is None:
+            raise ValueError("No proportioning selected")
+
+        after_dbid = last_event_id if last_event_id is not None else (after or 0)
+        events = live_tails.subscribe(db_connection, current_prop, query_analyzer_logging_tail, after_dbid, interval)
+
+        async def stream():
+            try:
+                async for event, data in events:
+                    if event == "samples":
+                        yield f"id: {int(data['logging_dbid'].iloc[-1])}\nevent: samples\ndata: {ColumnarJSONResponse.frame_json(data)}\n\n"
+                    elif event == "error":
+                        yield f"event: error\ndata: {json.dumps({'error': data})}\n\n"
+                    else:
+                        yield f"event: {event}\ndata: {{}}\n\n"
+            finally:
+                await events.aclose() # Leave the shared poller if the client disconnects
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error starting live tail: {e}"}, status_code=500)
+
 # ---------- SUMMARY TABLE ---------- #
 @router.get("/Summary")
-async def summary_table(request: Request):
+async def summary_table(request: Request, format: Optional[str] = Query(None, pattern=TABLE_FORMATS)): #format: records (default), columns or arrow
     db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
     
-    data = await db_connection.fetch_df(query_analyzer_summary, get_current_prop_id(request))
+    data = await db_connection.fetch_df_shared(query_analyzer_summary, get_current_prop_id(request)) #Shared with the Dosed Material graph request
     
     data = calculate(data) #Make all the calculations that are needed
     
@@ -156,37 +169,135 @@ async def summary_table(request: Request):
     data["Deviation"] = data["Deviation"].apply(lambda val: Deviation(val).name.capitalize()) # for val in data["Deviation"] -> Deviation(val).name.capitalize()
     data["Type Of Dosing"] = data["Type Of Dosing"].apply(lambda val: DosingType(val).name.capitalize() if val else "Unknown") # for val in data["TypeOfDosing"] -> DosingType(val).name.capitalize()
 
-    return data.to_dict(orient="records") #FastAPI expects a list of dictionaries for JSON response
+    return table_response(request, data, format) #Serialized straight from the DataFrame (list of records by default)
 
 # ---------- PROP RECORD ---------- #    
 @router.get("/PropRecord")
-async def propRecord_table(request: Request):
-    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-    data = await db_connection.fetch_df(query_analyzer_propRecord, get_current_prop_id(request))
-    return data.to_dict(orient="records") 
+async def propRecord_table(request: Request, format: Optional[str] = Query(None, pattern=STREAM_FORMATS)):
+    return await raw_table(request, query_analyzer_propRecord, format)
 
 # ---------- Logging Param ---------- #    
 @router.get("/LogginParam")
-async def propRecord_table(request: Request):
-    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-    data = await db_connection.fetch_df (query_analyzer_logginParam, get_current_prop_id(request))
-    return data.to_dict(orient="records") 
+async def propRecord_table(request: Request, format: Optional[str] = Query(None, pattern=STREAM_FORMATS)):
+    return await raw_table(request, query_analyzer_logginParam, format)
 
 # ---------- Lot table ---------- #    
 @router.get("/Lot")
-async def lot_table(request: Request):
-    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-    data = await db_connection.fetch_df(query_analyzer_lot, get_current_prop_id(request))
-    return data.to_dict(orient="records") 
+async def lot_table(request: Request, format: Optional[str] = Query(None, pattern=STREAM_FORMATS)):
+    return await raw_table(request, query_analyzer_lot, format)
 
 # ---------- Article table ---------- #    
 @router.get("/Article")
-async def article_table(request: Request):
+async def article_table(request: Request, format: Optional[str] = Query(None, pattern=STREAM_FORMATS)):
+    return await raw_table(request, query_analyzer_article, format)
+
+# Raw table of the current proportioning, in the requested format (format=ndjson streams it chunk by chunk)
+async def raw_table(request: Request, query: str, format: Optional[str]):
     db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-    data = await db_connection.fetch_df(query_analyzer_article, get_current_prop_id(request))
-    return data.to_dict(orient="records") 
+
+    if negotiate_format(request, format) == "ndjson":
+        return await ndjson_response(db_connection.stream_df(query, get_current_prop_id(request)))
+
+    data = await db_connection.fetch_df(query, get_current_prop_id(request))
+    return table_response(request, data, format) 
+
 
 
+# ----------------- Build the graphs (shared by the HTML and the Figure endpoints) ----------------- #
+async def build_slide_position_graph(request: Request, max_points: int) -> PlotPointsinTime:
+    # Connect to the user's environment
+    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+
+    # Get the current proportioning ID from the request cookies
+    current_prop = get_current_prop_id(request) 
+    # Fetch data from the database
+    df = await db_connection.fetch_df_cached(query=query_analyzer_logging, current_prop=current_prop, bulk=True) #One read of amadeus_logging shared by the three graphs (cached)
+
+    debug(current_prop, "Slide Position") # Debugging by console
+
+    #Generate an empty list for traces
+    trace_list = []
+    #Generate TraceData object and append it
+    trace_list.append(TraceData(label="Vibratos",  sample_time=0.01, x_data=df.index,  y_data=np.where(df["dc_out_controlvibrator"], 5, -10), mode="markers", color="grey"))
+    trace_list.append(TraceData(label="Knocer",  sample_time=0.01, x_data=df.index,  y_data=np.where(df["dc_out_controlknocker"], 2.5, -10), mode="markers", color="purple"))
+    trace_list.append(TraceData(label="Desired Position",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_desiredslideposition"], mode="lines", color="pink"))
+    trace_list.append(TraceData(label="Real Time Position",  sample_time=0.01, x_data=df.index,  y_data=df["plant_out_slideposition"], mode="lines", color="blue"))
+
+    return PlotPointsinTime( 
+        title="Slide Position", 
+        xaxis_title="Seconds", 
+        yaxis_title="mm", 
+        traces=trace_list,
+        leyend_pos=["top", "right"],
+        max_points=max_points
+    )
+
+async def build_dosed_material_graph(request: Request, max_points: int) -> PlotPointsinTime:
+    # Connect to the user's environment
+    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+
+    # Get the current proportioning ID from the request cookies
+    current_prop = get_current_prop_id(request) 
+    # Fetch data from the database (both at once, so they can join the requests of the other graphs and the Summary table)
+    df, summary = await asyncio.gather(
+        db_connection.fetch_df_cached(query=query_analyzer_logging, current_prop=current_prop, bulk=True), #One read of amadeus_logging shared by the three graphs (cached)
+        db_connection.fetch_df_shared(query_analyzer_summary, current_prop=current_prop) #Shared with the Summary table request
+    )
+
+    debug(current_prop,"Dosed Material") # Debugging by console
+
+    requested = float(summary["Requested"].iloc[0])
+    tolerance = float(summary["Tolerance"].iloc[0]) / 100
+    upper_tolerance = requested * (1 + tolerance)
+    lower_tolerance = requested * (1 - tolerance)
+
+
+    trace_list = []
+    #Smoothed filter for erasing small variations
+    smoothed = df["if_out_dosedweight"].rolling(window=100).mean().fillna(0) #0.1 seconds
+
+    #Generate TraceData object
+    trace_list.append(TraceData(label="Smoothed Dosed Material",  sample_time=0.01, x_data=df.index,  y_data=smoothed, mode="lines", color="grey")) 
+    trace_list.append(TraceData(label="Dosed Material",  sample_time=0.01, x_data=df.index,  y_data=df["if_out_dosedweight"], mode="lines", color="red"))
+    trace_list.append(TraceData.constant(label="Set Point",  value=requested, sample_time=0.01, x_data=df.index, mode="lines", color="Blue")) #Setpoint
+    trace_list.append(TraceData.constant(label="Upper Tolerance",  value=upper_tolerance, sample_time=0.01, x_data=df.index, mode="lines", color="Green", dash="dash"))
+    trace_list.append(TraceData.constant(label="Lower Tolerance",  value=lower_tolerance, sample_time=0.01, x_data=df.index, mode="lines", color="Green", dash="dash"))
+
+    return PlotPointsinTime(
+        title="Dosed Material", 
+        xaxis_title="Seconds", 
+        yaxis_title="kg", 
+        traces=trace_list,
+        leyend_pos=["bottom", "right"],
+        max_points=max_points
+    )
+
+async def build_material_flow_graph(request: Request, max_points: int) -> PlotPointsinTime:
+    # Connect to the user's environment
+    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+
+    # Get the current proportioning ID from the request cookies
+    current_prop = get_current_prop_id(request) 
+    # Fetch data from the database
+    df = await db_connection.fetch_df_cached(query=query_analyzer_logging, current_prop=current_prop, bulk=True) #One read of amadeus_logging shared by the three graphs (cached)
+
+    debug(current_prop, "Material Flow") # Debugging by console
+
+    #Generate an empty list for traces
+    trace_list = []
+    #Generate TraceData object and append it
+    trace_list.append(TraceData(label="Expected Flow",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_expectedflow"], mode="lines", color="blue"))
+    trace_list.append(TraceData(label="Desired Flow",  sample_time=0.01, x_data=df.index,  y_data=df["dc_out_desiredflow"], mode="lines", color="pink",  dash="dash"))
+    trace_list.append(TraceData(label="Actual Flow",  sample_time=0.01, x_data=df.index,  y_data=df["f_out_filteredflow2"], mode="lines", color="green"))
+    
+    return PlotPointsinTime( 
+        title="Material Flow", 
+        xaxis_title="Seconds", 
+        yaxis_title="Kg/s", 
+        traces=trace_list,
+        leyend_pos=["top", "right"],
+        max_points=max_points
+    )
 
 # ------------ Get the current proportioning ID from the request cookies ---------- #
 def get_current_prop_id(request: Request):
@@ -195,14 +306,8 @@ def get_current_prop_id(request: Request):
 
 # ----------------- Make all the calculations that are needed ----------------- #
 def calculate(data):
-    #Overwrite Endtime with EndTime - StartTime to calculate duration
-    data = CaclulateDateDelta(data, "Dosing Date", "Duration", overwrite=True).apply_calculation()
-    #Add percentage calculation column
-    data = CaclulatPercent(data, "Requested", "Tolerance", overwrite=False).apply_calculation()
-    #Add deviation column
-    data = IsInTolerance(data, "Requested", "Actual", "Tolerance").apply_calculation()
-    #Add Numeric Deviation column
-    data = NumericDeviation(data, "Requested", "Actual").apply_calculation()
+    #Duration (overwrites Duration), percentage (calc_per), Deviation and Numeric Deviation columns in one pass
+    data = CalculateProportioningMetrics(data, "Dosing Date", "Duration", "Requested", "Actual", "Tolerance").apply_calculation()
 
     return data
 
@@ -35,10 +35,8 @@ async def analyzer_status(request: Request):  # Get the current proportioning ID
 # ---------- Request data for table  ---------- #
 async def fetch_data(query_template: str, current_prop: int, db_connection: DBConnection) -> dict:
     try:
-        #Write the current_prop variable inside the query
-        query = query_template.format(current_prop=current_prop)
-        #Request the data
-        data = await db_connection.fetch_data(query=query)
+        #Request the data (current_prop is sent as a bound parameter)
+        data = await db_connection.fetch_data(query=query_template, current_prop=current_prop)
         return data
     
     except Exception as e:
@@ -0,0 +1,40 @@
+from datetime import date
+from fastapi import APIRouter
+from fastapi import Query, Request
+from typing import Optional
+from backend.classes.request import RequestEnvironment
+from backend.classes.responses import table_response, TABLE_FORMATS
+from backend.memory.state import proportioning_feeds
+
+# Create an APIRouter instance
+router = APIRouter()
+
+GROUP_KEYS = {"article": "ArticleDBID", "location": "DosingLocation", "type": "TypeOfDosing", "day": "Day"} # Values of group_by -> DosingRollup keys
+
+# ----------------- GET endpoint with the dosing KPIs (deviation rates, mean absolute deviation...) ----------------- #
+@router.get("/api/kpis")
+async def get_kpis(
+    request: Request,
+    group_by: str = Query("article,location,type,day", pattern=r"^((article|location|type|day)(,(article|location|type|day))*)?$"), # Comma separated (empty = one row for everything)
+    article_dbid: Optional[int] = Query(None),
+    location: Optional[int] = Query(None), # DosingLocation
+    dosing_type: Optional[int] = Query(None), # TypeOfDosing (1 Normal, 2 Learning, 100 D2e)
+    date_from: Optional[date] = Query(None), # First day (StartTime), included
+    date_to: Optional[date] = Query(None), # Last day (StartTime), included
+    format: Optional[str] = Query(None, pattern=TABLE_FORMATS) # records (default), columns or arrow (also chosen with the Accept header)
+):
+    try:
+        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+
+        # Bring the rollup up to date (only the proportionings finished since the last request are read), then answer from it
+        feed = proportioning_feeds[db_connection.name]
+        await feed.refresh(db_connection)
+
+        keys = [GROUP_KEYS[key] for key in dict.fromkeys(group_by.split(",")) if key]
+        data = feed.consumers["rollup"].kpis(keys, article_dbid, location, dosing_type, date_from, date_to)
+
+        return table_response(request, data, format)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
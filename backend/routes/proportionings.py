@@ -1,33 +1,79 @@
 import pandas as pd
 from fastapi import APIRouter
 from fastapi import Query, Request
-from backend.database.query import query_proportionings, query_proportionings_filter, query_article_list
-from backend.classes.filter_data import  ReadableDataFormatter, FilterByString, Deviation
-from backend.classes.request import UserInfo, RequestEnvironment, RequestRows
-from backend.classes.calculation import CaclulateDateDelta, CaclulatPercent, IsInTolerance, NumericDeviation
-from backend.memory.state import session_data
-from typing import List, Dict, Any, Union
+from backend.database.query import query_proportionings, query_proportionings_filter, query_article_list, sql_deviation
+from backend.classes.filter_data import  ReadableDataFormatter, Deviation
+from backend.classes.request import UserInfo, RequestEnvironment, RequestRows, connect_to_environment, resolve_proportioning_keys, store_proportioning_keys
+from backend.classes.calculation import CalculateProportioningMetrics
+from backend.classes.responses import table_response, negotiate_format, ndjson_response, TABLE_FORMATS, STREAM_FORMATS
+from backend.memory.state import session_data, proportioning_caches
+from datetime import timedelta
+from typing import List, Dict, Any, Union, Optional, Tuple
 
 # Create an APIRouter instance
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 500 # Rows per page when only the cursor (before_dbid) is given
+KEYSET_CONDITION = "amadeus_proportioning.proportioning_dbid < :before_dbid" # Rows are ordered by proportioning_dbid DESC
+AGE_UNITS = ("minutes", "hours", "days") # Time units accepted by the Age filter
+FILTERED_MAX_ROWS = 500 # Most rows of the filtered table without paging parameters
+
 # ----------------- GET endpoint to retrieve proportioning data (Controls -> Update button) ----------------- #
 
 @router.get("/api/proportionings")
-async def get_proportionings(request: Request) -> Union[List[Dict[str, Any]], Dict[str, str]]:
+async def get_proportionings(
+    request: Request,
+    before_dbid: Optional[int] = Query(None), # Cursor: only proportionings older than this one (keyset pagination)
+    page_size: Optional[int] = Query(None, ge=1, le=10000), # Rows per page (keyset pagination)
+    since_dbid: Optional[int] = Query(None), # Delta refresh: only proportionings newer than this one, plus the changed ones
+    since_revision: Optional[int] = Query(None), # Delta refresh: "revision" of the previous delta response
+    format: Optional[str] = Query(None, pattern=STREAM_FORMATS) # records (default), columns, arrow or ndjson (streamed) (also chosen with the Accept header)
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     try:        
         db_connection = RequestEnvironment(request).ConnectToUserEnvironment()  # Get the DBConnection object based on the user's environment
 
-        # Fetch data from the database
-        data = await db_connection.fetch_df(query=query_proportionings.format(rows=RequestRows(request).get_rows())) #Raw Data (Limited to 1000 rows by default)
+        # Delta refresh (Update button): merge the new/unfinished proportionings into the environment cache, send only what changed
+        if since_dbid is not None:
+            cache = proportioning_caches[db_connection.name]
+            revision = await cache.refresh(db_connection, query_proportionings, format_proportionings)
+            rows, full = cache.delta(since_dbid, since_revision, RequestRows(request).get_rows())
+            return table_response(request, {"rows": rows, "latest_dbid": cache.latest_dbid, "revision": revision, "full": full}, format)
+
+        # Streamed export: read, calculate and format chunk by chunk (memory stays flat, first rows are sent right away)
+        if negotiate_format(request, format) == "ndjson":
+            where_clause, params = "", {"rows": page_size or RequestRows(request).get_rows()}
+            if before_dbid is not None:
+                where_clause, params["before_dbid"] = f"WHERE {KEYSET_CONDITION}", before_dbid
 
-        #Make all the calculations that are needed
-        data = calculate(data)
+            chunks = db_connection.stream_df(query=query_proportionings.format(where_clause=where_clause), **params)
+            return await ndjson_response(chunks, lambda chunk: make_db_redable(calculate(chunk)))
 
-        #Make data redable
-        data = make_db_redable(data)
+        # Without paging parameters, keep the old behaviour: "rows" rows (Settings) in a plain list
+        if before_dbid is None and page_size is None:
+            # Fetch data from the database
+            data = await db_connection.fetch_df(query=query_proportionings.format(where_clause=""), rows=RequestRows(request).get_rows()) #Raw Data (Limited to 1000 rows by default)
+
+            #Make all the calculations that are needed
+            data = calculate(data)
+
+            #Make data redable
+            data = make_db_redable(data)
 
-        return data #Return data
+            return table_response(request, data, format) #Return data (serialized straight from the DataFrame)
+
+        page_size = page_size or DEFAULT_PAGE_SIZE
+        where_clause, params = "", {"rows": page_size + 1} # Fetch one row more than the page, it only tells if there is a next page
+        if before_dbid is not None:
+            where_clause, params["before_dbid"] = f"WHERE {KEYSET_CONDITION}", before_dbid
+
+        revision = await loaded_revision(db_connection) # Before reading the page: the first delta refresh starts from it
+        data = await db_connection.fetch_df(query=query_proportionings.format(where_clause=where_clause), **params)
+        data, next_before_dbid = paginate(data, page_size)
+
+        #Calculations and formatting only for the rows of this page
+        rows = format_proportionings(data) if not data.empty else data
+
+        return table_response(request, {"rows": rows, "next_before_dbid": next_before_dbid, "page_size": page_size, "revision": revision}, format)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -43,8 +89,11 @@ async def get_proportionings_filtered(
     timeUnit: str = Query("Minutes"),  # Parameter for time unit (minutes, hours, days) (Default Minutes)
     rangeValue: int = Query(50),  # Parameter for slider value (default to 50) 
     deviationSwitchChecked: bool = Query(False),  # Parameter for Deviation Filter switch (Default False)
-    requestedDeviation: str = Query("")  # Parameter for requested deviation type (Default is empty string, if no input is given) 
-) -> List[Dict[str, Any]]:
+    requestedDeviation: str = Query(""),  # Parameter for requested deviation type (Default is empty string, if no input is given) 
+    before_dbid: Optional[int] = Query(None), # Cursor: only proportionings older than this one (keyset pagination)
+    page_size: Optional[int] = Query(None, ge=1, le=10000), # Rows per page (keyset pagination)
+    format: Optional[str] = Query(None, pattern=TABLE_FORMATS) # records (default), columns or arrow (also chosen with the Accept header)
+) -> Union[List[Dict[str, Any]], Dict[str, Any]]:
     
     try:
         db_connection = RequestEnvironment(request).ConnectToUserEnvironment()  # Get the DBConnection object based on the user's environment
@@ -55,11 +104,13 @@ async def get_proportionings_filtered(
         # Initialize an empty where clause (To avoid errors if no filters are applied with "none" values in the query)
         where_clause = ""
 
-        # Initialize an empty list to hold conditions
+        # Initialize an empty list to hold conditions (fixed SQL with :parameters) and a dict for their values
         conditions = []
+        params = {}
         #Filter by Article if it's requested
         if switchChecked:
-            conditions.append(f"amadeus_proportioning.article_dbid = '{requestedArticle}'")  # Add condition for ArticleName
+            conditions.append("amadeus_proportioning.article_dbid = :article_dbid")  # Add condition for ArticleName
+            params["article_dbid"] = int(requestedArticle)
             print("\n"+"*"*50 +"\n* Article Filter Switch enabled" + " "*18 + "*")
             print(f"* Requested Article DB ID: {requestedArticle:<28}* \n"+"*"*50+"\n")
             
@@ -67,32 +118,52 @@ async def get_proportionings_filtered(
         # Handle Age Filter logic
         if ageSwitchChecked:
             # Filter by age range if needed based on rangeValue and timeUnit
-            conditions.append(f"start_time >= NOW() - INTERVAL '{rangeValue} {timeUnit}'")
+            if timeUnit.lower() not in AGE_UNITS:
+                raise ValueError(f"Unknown time unit '{timeUnit}', use one of: {AGE_UNITS}")
+            conditions.append("start_time >= NOW() - :age")
+            params["age"] = timedelta(**{timeUnit.lower(): rangeValue}) # Sent as a Postgres interval
             # Add the age filter to the where clause
             print("\n" + "*" * 50 + "\n* Age Filter Switch enabled" + " "*22 + "*")
             print(f"* Requested Time: {rangeValue} {timeUnit:<28}* \n" + "*" * 50 + "\n")
 
+        # Filter by Deviation if it's requested (classified in SQL, so LIMIT only counts the matching rows)
+        if deviationSwitchChecked:
+            deviation = Deviation(int(requestedDeviation)) # Validate the requested deviation type (ValueError if unknown)
+            conditions.append(f"({sql_deviation}) = :deviation")
+            params["deviation"] = deviation.value
+            print("\n"+"*"*50 +"\n* Deviation Filter Switch enabled" + " "*16 + "*")
+            print(f"* Requested Deviation Type: {deviation.name:<21}* \n"+"*"*50+"\n") #print the requested deviation type name, not the numeric value.
+
+        paging = before_dbid is not None or page_size is not None
+        if paging:
+            page_size = page_size or DEFAULT_PAGE_SIZE
+            if before_dbid is not None:
+                conditions.append(KEYSET_CONDITION) # Continue after the last row of the previous page
+                params["before_dbid"] = before_dbid
+
         if conditions:
             where_clause = "WHERE " + " AND ".join(conditions)
 
-        # Fetch data from the database
-        data = await db_connection.fetch_df(query=query_proportionings_filtered.format(where_clause=where_clause, rows=RequestRows(request).get_rows())) #Raw Data
-            
-        data = calculate(data)
+        if paging:
+            # Fetch one row more than the page, it only tells if there is a next page
+            data = await db_connection.fetch_df(query=query_proportionings_filtered.format(where_clause=where_clause), rows=page_size + 1, **params)
+            data, next_before_dbid = paginate(data, page_size)
 
-        # If deviation switch is checked, filter by requested deviation type (This is done in the backend, that's why is done after fetching the data)
-        if deviationSwitchChecked:
-            print("\n"+"*"*50 +"\n* Deviation Filter Switch enabled" + " "*16 + "*")
-            print(f"* Requested Deviation Type: {Deviation(int(requestedDeviation)).name:<21}* \n"+"*"*50+"\n") #print the requested deviation type name, not the numeric value.
-            data = FilterByString(data, requestedDeviation, "Deviation").apply_filter() 
+            #Calculations and formatting only for the rows of this page
+            rows = make_db_redable(calculate(data)) if not data.empty else data
+
+            return table_response(request, {"rows": rows, "next_before_dbid": next_before_dbid, "page_size": page_size}, format)
+
+        # Fetch data from the database (Limited to 500 rows for performance reasons, in the query's LIMIT)
+        data = await db_connection.fetch_df(query=query_proportionings_filtered.format(where_clause=where_clause), rows=min(RequestRows(request).get_rows(), FILTERED_MAX_ROWS), **params) #Raw Data
 
         #Make all the calculations that are needed (After filtering the data for avoiding unnecessary calculations)
         if not data.empty:
-            data = data.head(500).copy()  # Limit to 500 rows for performance reasons
+            data = calculate(data)
             #Make data redable
             data = make_db_redable(data)
 
-        return data #Return data
+        return table_response(request, data, format) #Return data (serialized straight from the DataFrame)
         
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -100,21 +171,21 @@ async def get_proportionings_filtered(
     
 # ----------------- Request all the article names ----------------- #
 @router.get("/api/articlenames")
-async def get_article_names(request: Request) ->  Union[List[Dict[str, Any]], Dict[str, str]]: #Only allow List of Dicts or error message
+async def get_article_names(request: Request, format: Optional[str] = Query(None, pattern=TABLE_FORMATS)) ->  Union[List[Dict[str, Any]], Dict[str, str]]: #Only allow List of Dicts or error message
     try:
         rows = RequestRows(request).get_rows()
         
         db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
 
         # Fetch data from the database
-        data = await db_connection.fetch_df(query=query_article_list.format(rows=rows))  
+        data = await db_connection.fetch_df(query=query_article_list, rows=rows)  
         # Convert the data to a pandas DateFrame
         df = pd.DataFrame(data)
         #Get unique values from the 'ArticleName' column
-        result = df[['ArticleDBID', 'ArticleName']].drop_duplicates().to_dict(orient="records")
+        result = df[['ArticleDBID', 'ArticleName']].drop_duplicates()
         
-        # Create a list of dictionaries (required format) and return the results
-        return result
+        # Return the results as a list of records (serialized straight from the DataFrame)
+        return table_response(request, result, format)
 
     except Exception as e:
         print(f"Error: {str(e)}")
@@ -138,24 +209,54 @@ async def handle_row_click( body: UserInfo):
 
     session_data[uid]["current_prop_id"] = propDbId # Store the propDbId in the session_data dictionary under the UID
 
+    # Resolve the immutable keys of the proportioning once (lot_dbid, article_dbid), the pages read them from the session
+    environment = session_data[uid].get("environment")
+    try:
+        keys = await resolve_proportioning_keys(connect_to_environment(environment), propDbId)
+        if keys is not None:
+            store_proportioning_keys(uid, {"proportioning_dbid": propDbId, "environment": environment, **keys}) # Unless another row was clicked meanwhile
+    except Exception as e:
+        print(f"Error: {str(e)}") # Resolved again when a page needs them
+
     return {"propDbId": propDbId} # Return a confirmation message as a JSON response (Not mandatory for now)
 
 
 # ----------------- Make all the calculations that are needed ----------------- #
 def calculate(data):
-    #Overwrite Endtime with EndTime - StartTime to calculate duration
-    data = CaclulateDateDelta(data, "StartTime", "EndTime", overwrite=True).apply_calculation()
-    #Add percentage calculation column
-    data = CaclulatPercent(data, "Requested", "Tolerance", overwrite=False).apply_calculation()
-    #Add deviation column
-    data = IsInTolerance(data, "Requested", "Actual", "Tolerance").apply_calculation()
-    #Add Numeric Deviation column
-    data = NumericDeviation(data, "Requested", "Actual").apply_calculation()
+    #Duration (overwrites EndTime), percentage (calc_per), Deviation and Numeric Deviation columns in one pass
+    data = CalculateProportioningMetrics(data, "StartTime", "EndTime", "Requested", "Actual", "Tolerance").apply_calculation()
 
     return data
 
+# ----------------- Keyset pagination helpers ----------------- #
+def paginate(data: pd.DataFrame, page_size: int) -> Tuple[pd.DataFrame, Optional[int]]:
+    """
+    Cut the fetched rows to one page. If there are more rows than page_size, return the cursor for the next page
+    (the proportioning_dbid of the last row of this page), else None.
+    """
+    if len(data) <= page_size:
+        return data, None
+
+    data = data.head(page_size).copy()
+    return data, int(data["ProportioningDBID"].iloc[-1])
+
+# ----------------- Delta refresh helpers ----------------- #
+def format_proportionings(data: pd.DataFrame) -> pd.DataFrame:
+    return make_db_redable(calculate(data))
+
+async def loaded_revision(db_connection) -> int:
+    """
+    Revision of the environment cache for rows read from the database now. Every row that changes after it (also the
+    ones that finish before the client's first refresh) gets a higher revision, so a delta refresh with
+    since_revision=<this revision> sends it. The cache is filled first if it is still empty.
+    """
+    cache = proportioning_caches[db_connection.name]
+    if cache.rows is None:
+        return await cache.refresh(db_connection, query_proportionings, format_proportionings)
+    return cache.revision
+
 #  -----------------  Filter Database to make it more redable  ----------------- #
-def make_db_redable(df: pd.DataFrame) -> List[Dict[str, Any]]:
+def make_db_redable(df: pd.DataFrame) -> pd.DataFrame:
     formatter = ReadableDataFormatter(df)
     return formatter.apply_all_formats()
 
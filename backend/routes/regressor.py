@@ -1,12 +1,15 @@
 # backend/routes/regressor.py
 from fastapi import APIRouter, Request
 from fastapi import Query
-from fastapi.responses import HTMLResponse
-from backend.classes.db_connection import DBConnection
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from typing import Optional
+import pandas as pd
 from backend.classes.graphs import LogScatterPlot
-from backend.database.query import query_regressor_graph, query_regression_table
+from backend.database.query import query_regressor_lot_summary
 from backend.classes.request import RequestLotId, RequestEnvironment
 from backend.classes.calculation import CalculateLogTraces
+from backend.classes.responses import table_response, TABLE_FORMATS
+from backend.memory.state import regression_cache, regression_store, fleet_regression
 
 # Create an APIRouter instance
 router = APIRouter(prefix="/regressor")  
@@ -17,65 +20,105 @@ async def generate_graph(
     intermediates: int = Query(100), #Parametes for Interemdiate/Bin value (default 200)
     amountOfRegressions: int = Query(2) #Parameter for Amount of Regressions (default 2)    
 ):
+    try:
+        graph = await build_regressor_graph(request, intermediates, amountOfRegressions)
+        # Return raw HTML
+        return graph.plot_graph()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        # Retrun error
+        return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+
+@router.get("/GraphFigure")
+async def generate_graph_figure(
+    request: Request, #Request object to extract the lot_id
+    intermediates: int = Query(100), #Parametes for Interemdiate/Bin value (default 200)
+    amountOfRegressions: int = Query(2) #Parameter for Amount of Regressions (default 2)    
+):
+    try:
+        graph = await build_regressor_graph(request, intermediates, amountOfRegressions)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
+
+@router.get("/SummaryTable")
+async def summary_table(request: Request, format: Optional[str] = Query(None, pattern=TABLE_FORMATS)): #format: records (default), columns or arrow
     try:
         db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
 
-        #Extract lot_id and print it
-        lot_id = await RequestLotId(request).return_data() 
+        #Flow table and intermediate count of the lot in one statement (no rows -> empty table)
+        data = await fetch_lot_summary(request, db_connection)
+        data["IntermediateCount"] = data["IntermediateCount"].astype(str)
 
-        #Format the query with the current lot id
-        query = query_regressor_graph.format(current_lot=lot_id)
+        return table_response(request, data, format)
 
-        #Generate a dataframe with the DB query
-        df = await db_connection.fetch_df(query=query) 
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
 
-        log_traces = CalculateLogTraces(data = df, x_data ="flow", y_data= "opening", 
-            size="measurement_time", bins=intermediates, grades=(2,amountOfRegressions+1)) #Regression grade two to Regression Grade (Amount of Regressions+ 1) plot
+# ---------- Fleet-wide fits (every lot of the environment, computed in the background on a process pool) ---------- #
+@router.post("/Fleet")
+async def start_fleet_regression(
+    request: Request,
+    amountOfRegressions: int = Query(2, ge=1, le=9) #Same grades as the graph: two to (Amount of Regressions + 1)
+):
+    try:
+        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+        return fleet_regression.start(db_connection, (2, amountOfRegressions + 1))
 
-        graph_html = LogScatterPlot(
-            title="", 
-            xaxis_title="Flow[kg/s]", 
-            yaxis_title="Slide position [mm]", 
-            traces=log_traces.apply_calculation(),
-            leyend_pos=["top", "left"]
-        ).plot_graph()
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
 
-        # Return raw HTML
-        return graph_html
+@router.get("/Fleet")
+async def get_fleet_regression(
+    request: Request,
+    format: Optional[str] = Query(None, pattern=TABLE_FORMATS) # records (default), columns or arrow (also chosen with the Accept header)
+):
+    try:
+        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+        #Status of the last run and its rows (the previous result while a new run is going on)
+        rows = fleet_regression.results(db_connection.name)
+        return table_response(request, {**fleet_regression.status(db_connection.name), "rows": rows if rows is not None else pd.DataFrame()}, format)
 
     except Exception as e:
-        print(f"Error: {e}")
-        # Retrun error
-        return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
 
-@router.get("/SummaryTable")
-async def summary_table(request: Request):
+# ---------- Build the regression graph (shared by the HTML and the Figure endpoints) ---------- #
+async def build_regressor_graph(request: Request, intermediates: int, amountOfRegressions: int) -> LogScatterPlot:
     db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-    #Extract lot_id
+
+    #Lot of the current proportioning (resolved when the row was clicked, kept in the session)
     lot_id = await RequestLotId(request).return_data() 
 
-    data = await fetch_table_data(query_regression_table,db_connection, lot_id)
-    
-    #Format the query with the current lot id
-    query = query_regressor_graph.format(current_lot=lot_id)
+    #Intermediates of the lot and their fit, updated with the intermediates added since the last refresh
+    lot = await regression_store.refresh(db_connection, lot_id)
+    df = lot.rows.copy() #CalculateLogTraces adds the log column
 
-    #Generate a dataframe with the DB query (For calculate the length)
-    df = await db_connection.fetch_df(query=query) 
+    log_traces = CalculateLogTraces(data = df, x_data ="flow", y_data= "opening", 
+        size="measurement_time", bins=intermediates, grades=(2,amountOfRegressions+1)) #Regression grade two to Regression Grade (Amount of Regressions+ 1) plot
 
-    if data:
-        data[0]["IntermediateCount"] = f"{len(df)}"
-    return data
+    #Coefficients once per lot content and grades (a new intermediate changes the count), moving the bins slider only re-evaluates the curves
+    key = (db_connection.name, lot_id, len(df), log_traces.grades)
+    coefficients = regression_cache.get(key)
+    if coefficients is None:
+        coefficients = lot.regression.fit_degrees(range(log_traces.grades[0], log_traces.grades[1] + 1))
+        regression_cache.put(key, coefficients)
 
+    return LogScatterPlot(
+        title="", 
+        xaxis_title="Flow[kg/s]", 
+        yaxis_title="Slide position [mm]", 
+        traces=log_traces.apply_calculation(coefficients),
+        leyend_pos=["top", "left"]
+    )
 
-# ---------- Request data for table  ---------- #
-async def fetch_table_data(query_template: str, db_connection: DBConnection, lot_id: int = None) -> dict:
-    try:
-        #Write the current_prop variable inside the query
-        query = query_template.format(current_lot=lot_id)
-        #Request the data
-        data = await db_connection.fetch_data(query=query)
-        return data
-    
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return {"error": str(e)}
\ No newline at end of file
+# ---------- Lot summary of the current proportioning ---------- #
+async def fetch_lot_summary(request: Request, db_connection) -> pd.DataFrame:
+    lot_id = await RequestLotId(request).return_data()
+    return await db_connection.fetch_df_shared(query_regressor_lot_summary, current_lot=lot_id)
@@ -1,8 +1,9 @@
 # backend/routes/settings.py
 from fastapi import APIRouter, Request
-from backend.memory.state import session_data
+from backend.memory.state import session_data, frame_cache
 from backend.classes.request import UserInfo
 from backend.database.config import env_map
+from backend.database.db_connections import ALL_DB_CONNECTIONS
 
 # Create an APIRouter instance
 router = APIRouter(prefix="/settings")  
@@ -31,6 +32,7 @@ async def handle_selected_environmnet(request: Request,  body: UserInfo):
 
     session_data[uid]["environment"] = environment # Store the propDbId in the session_data dictionary under the UID
     session_data[uid]["current_prop_id"] = None # Reset the propDbId when changing environment (For avoiding request of not existing propDbId)
+    session_data[uid]["proportioning_keys"] = None # And the keys resolved for it
     session_data[uid]["rows"] = rows
 
     return {"environment": environment}
@@ -42,4 +44,16 @@ async def get_available_environments():
     #Get a list of the env defined in the config.py
     env_list = list(env_map.keys())
     
-    return env_list 
\ No newline at end of file
+    return env_list 
+
+
+@router.get("/cachestats")
+async def get_cache_stats():
+    #Hit/miss/eviction counters and memory use of the logging frame cache (for sizing it)
+    return frame_cache.stats()
+
+
+@router.get("/poolstats")
+async def get_pool_stats():
+    #Connections checked out/in, overflow and checkout wait times of every environment pool (for sizing them)
+    return {env_name: db_connection.pool_stats() for env_name, db_connection in ALL_DB_CONNECTIONS.items()}
@@ -0,0 +1,108 @@
+from fastapi import APIRouter
+from fastapi import Query, Request
+from typing import Optional
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+from backend.classes.graphs import ControlChartPlot, TraceData
+from backend.classes.request import RequestEnvironment
+from backend.classes.responses import table_response, TABLE_FORMATS
+from backend.memory.state import proportioning_feeds
+
+router = APIRouter(prefix="/spc")
+
+# ---------- Current state of every control chart (one row per article and dosing location) ---------- #
+@router.get("/Charts")
+async def spc_charts(
+    request: Request,
+    signals_only: bool = Query(False), #Only the charts with an EWMA or CUSUM signal in their last point
+    format: Optional[str] = Query(None, pattern=TABLE_FORMATS) #records (default), columns or arrow
+):
+    try:
+        spc = await refresh_spc(request)
+        return table_response(request, spc.summary(signals_only), format)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
+
+# ---------- Points of one control chart (deviation %, EWMA and limits, CUSUM, rolling std, signals) ---------- #
+@router.get("/Points")
+async def spc_points(
+    request: Request,
+    article_dbid: int = Query(...),
+    location: int = Query(...), #DosingLocation
+    format: Optional[str] = Query(None, pattern=TABLE_FORMATS) #records (default), columns or arrow
+):
+    try:
+        chart = await get_chart(request, article_dbid, location)
+        return table_response(request, chart.points(), format)
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"error": str(e)}
+
+# ---------- Generate and return interactive CONTROL CHART ---------- #
+@router.get("/ControlChart", response_class=HTMLResponse)
+async def generate_control_chart(request: Request, article_dbid: int = Query(...), location: int = Query(...)):
+    try:
+        graph = await build_control_chart(request, article_dbid, location)
+        # Return raw HTML
+        return graph.plot_graph()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+
+@router.get("/ControlChartFigure")
+async def generate_control_chart_figure(request: Request, article_dbid: int = Query(...), location: int = Query(...)):
+    try:
+        graph = await build_control_chart(request, article_dbid, location)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
+
+
+# ----------------- Bring the SPC state up to date (only the proportionings finished since the last request are read) ----------------- #
+async def refresh_spc(request: Request):
+    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+    feed = proportioning_feeds[db_connection.name]
+    await feed.refresh(db_connection)
+    return feed.consumers["spc"]
+
+async def get_chart(request: Request, article_dbid: int, location: int):
+    chart = (await refresh_spc(request)).chart(article_dbid, location)
+    if chart is None:
+        raise ValueError(f"No finished proportionings of article {article_dbid} at dosing location {location}")
+    return chart
+
+# ----------------- Build the graph (shared by the HTML and the Figure endpoints) ----------------- #
+async def build_control_chart(request: Request, article_dbid: int, location: int) -> ControlChartPlot:
+    points = (await get_chart(request, article_dbid, location)).points()
+    sample = points["Sample"]
+    signals = points[points["EWMASignal"] | points["CUSUMSignal"]]
+
+    #Deviation % with the EWMA and its limits (left axis)
+    trace_list = []
+    trace_list.append(TraceData(label="Deviation %", x_data=sample, y_data=points["DeviationPercent"], mode="markers", color="grey", marker=dict(color="grey", size=5)))
+    trace_list.append(TraceData(label="EWMA", x_data=sample, y_data=points["EWMA"], mode="lines", color="blue"))
+    trace_list.append(TraceData(label="EWMA UCL", x_data=sample, y_data=points["EWMALimit"], mode="lines", color="red", dash="dash"))
+    trace_list.append(TraceData(label="EWMA LCL", x_data=sample, y_data=-points["EWMALimit"], mode="lines", color="red", dash="dash"))
+    trace_list.append(TraceData.constant(label="Target", value=0.0, x_data=sample, mode="lines", color="green"))
+
+    #CUSUM (right axis)
+    cusum_list = []
+    cusum_list.append(TraceData(label="CUSUM C+", x_data=sample, y_data=points["CUSUMPos"], mode="lines", color="orange"))
+    cusum_list.append(TraceData(label="CUSUM C-", x_data=sample, y_data=points["CUSUMNeg"], mode="lines", color="purple"))
+    cusum_list.append(TraceData(label="Decision Interval", x_data=sample, y_data=points["CUSUMLimit"], mode="lines", color="black", dash="dot"))
+
+    return ControlChartPlot(
+        title=f"Control Chart - Article {article_dbid}, Location {location}",
+        xaxis_title="Sample",
+        yaxis_title="Deviation %",
+        leyend_pos=["top", "left"],
+        traces=trace_list,
+        cusum_traces=cusum_list,
+        signals=TraceData(label="Signal", x_data=signals["Sample"], y_data=signals["DeviationPercent"], mode="markers", color="red")
+    )
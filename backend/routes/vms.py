@@ -1,10 +1,12 @@
 # backend/routes/vms.py
 import numpy as np
+from typing import Optional
 from fastapi import APIRouter, Request
 from fastapi import Query
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from backend.classes.graphs import Traces3DPlot , TraceData
 from backend.classes.request import RequestPropId, RequestEnvironment
+from backend.classes.responses import table_response, TABLE_FORMATS
 from backend.database.query import query_vms_data, query_vms_parameters, query_vms_summary_table
 
 # Create an APIRouter instance
@@ -13,76 +15,90 @@ router = APIRouter(prefix="/vms")
 @router.get("/Graph", response_class=HTMLResponse)
 async def generate_graph(request: Request):
     try:
-        db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
-        current_prop = RequestPropId(request).return_data()
-        #Take the data from the prop ID requested
-        df = await db_connection.fetch_df(query_vms_data, current_prop)
-        
-        #Take the parameters from the prop ID requested
-        df_params = await db_connection.fetch_df(query_vms_parameters, current_prop)
-        
-        #Filter the dataframe to only take the data INSIDE the box 
-        df = take_data_inside_the_box(df)
-        
-        #Extra information
-        n = len(df) #Number of Samples
-        y_vals = np.linspace(0, 570, n) #Space then equally in 570 values (Distance of the box)
-
-        #Load x values for each sensor (Needs to be taken from db, also the height of the sensors) (Temporal solution)
-        x_left=df_params.at[0, "offset_l_x"] #Left sensor x value
-        x_mid= df_params.at[0, "offset_m_x"] #Middle sensor x value]
-        x_right = df_params.at[0, "offset_r_x"] #Right sensor x value
-        #Load y values for each sensor (Needs to be taken from db, also the height of the sensors) (Temporal solution)
-        y_left= 650 - df_params.at[0, "offset_l_y"] #Left sensor y value
-        y_mid = 650 - df_params.at[0, "offset_m_y"] #Middle sensor y value
-        y_right = 650 - df_params.at[0, "offset_r_y"] #Right sensor y value   
-    
-        #Level the sensors to the same height
-        df["sensor_l"] = df["sensor_l"] - y_left
-        df["sensor_m"] = df["sensor_m"] - y_mid
-        df["sensor_r"] = df["sensor_r"] - y_right
-        
-        #Iterate new values for the material on the wall of the box
-        m_left = (df["sensor_m"]-df["sensor_l"])/(x_mid-x_left)
-        z_left_zero = m_left * (0- x_left) + df["sensor_l"]
-
-        m_right = (df["sensor_m"]-df["sensor_r"])/(x_mid-x_right)
-        z_right_zero = m_right * (367 - x_right) + df["sensor_r"]
-        
-        #Generate an empty list for traces
-        trace_list = []
-        #Generate TraceData object and append it
-        trace_list.append(TraceData("z0", x_data=np.zeros(n), y_data=y_vals, z_data=np.full(n, 0), color="grey", dash='dot'))
-        trace_list.append(TraceData("LeftZero", x_data=np.zeros(n), y_data=y_vals, z_data=z_left_zero, color="black", dash='dot'))
-        trace_list.append(TraceData("Left", x_data=np.full(n, x_left), y_data=y_vals, z_data=df["sensor_l"], color="black"))
-        trace_list.append(TraceData("Middle", x_data=np.full(n, x_mid), y_data=y_vals, z_data=df["sensor_m"], color="red"))
-        trace_list.append(TraceData("Right", x_data=np.full(n, x_right), y_data=y_vals, z_data=df["sensor_r"], color="blue"))
-        trace_list.append(TraceData("RightZero", x_data=np.full(n, 367), y_data=y_vals, z_data=z_right_zero, color="blue", dash='dot'))
-        trace_list.append(TraceData("z1", x_data=np.full(n, 367), y_data=y_vals,  z_data= np.full(n, 0), color="gray", dash='dot'))
-
-        graph_html = Traces3DPlot(trace_list).plot_graph()
-
+        graph = await build_vms_graph(request)
         # Return raw HTML
-        return graph_html
+        return graph.plot_graph()
 
     except Exception as e:
         print(f"Error: {e}")
         # Retrun error
         return HTMLResponse(f"<p>Error generating graph: {e}</p>", status_code=500)
+
+@router.get("/GraphFigure")
+async def generate_graph_figure(request: Request):
+    try:
+        graph = await build_vms_graph(request)
+        # Return the Plotly figure as JSON (plotly.js is loaded once by the page)
+        return Response(graph.plot_json(), media_type="application/json")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return JSONResponse({"error": f"Error generating graph: {e}"}, status_code=500)
     
 @router.get("/Summary")
-async def generate_summary_table(request: Request):
+async def generate_summary_table(request: Request, format: Optional[str] = Query(None, pattern=TABLE_FORMATS)):
     try:
         db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
         current_prop = RequestPropId(request).return_data()
         data = await db_connection.fetch_df(query_vms_summary_table, current_prop)
-        return data.to_dict(orient="records")
+        return table_response(request, data, format)
     except Exception as e:
         return {"error": str(e)}
 
 
 
 
+# Build the 3D graph of the box (shared by the HTML and the Figure endpoints)
+async def build_vms_graph(request: Request) -> Traces3DPlot:
+    db_connection = RequestEnvironment(request).ConnectToUserEnvironment()
+    current_prop = RequestPropId(request).return_data()
+    #Take the data from the prop ID requested
+    df = await db_connection.fetch_df_cached(query_vms_data, current_prop, bulk=True) #Cached (the scan of a finished proportioning never changes), read as binary arrays
+    
+    #Take the parameters from the prop ID requested
+    df_params = await db_connection.fetch_df(query_vms_parameters, current_prop)
+    
+    #Filter the dataframe to only take the data INSIDE the box 
+    df = take_data_inside_the_box(df)
+    
+    #Extra information
+    n = len(df) #Number of Samples
+    y_vals = np.linspace(0, 570, n) #Space then equally in 570 values (Distance of the box)
+
+    #Load x values for each sensor (Needs to be taken from db, also the height of the sensors) (Temporal solution)
+    x_left=df_params.at[0, "offset_l_x"] #Left sensor x value
+    x_mid= df_params.at[0, "offset_m_x"] #Middle sensor x value]
+    x_right = df_params.at[0, "offset_r_x"] #Right sensor x value
+    #Load y values for each sensor (Needs to be taken from db, also the height of the sensors) (Temporal solution)
+    y_left= 650 - df_params.at[0, "offset_l_y"] #Left sensor y value
+    y_mid = 650 - df_params.at[0, "offset_m_y"] #Middle sensor y value
+    y_right = 650 - df_params.at[0, "offset_r_y"] #Right sensor y value   
+
+    #Level the sensors to the same height
+    df["sensor_l"] = df["sensor_l"] - y_left
+    df["sensor_m"] = df["sensor_m"] - y_mid
+    df["sensor_r"] = df["sensor_r"] - y_right
+    
+    #Iterate new values for the material on the wall of the box
+    m_left = (df["sensor_m"]-df["sensor_l"])/(x_mid-x_left)
+    z_left_zero = m_left * (0- x_left) + df["sensor_l"]
+
+    m_right = (df["sensor_m"]-df["sensor_r"])/(x_mid-x_right)
+    z_right_zero = m_right * (367 - x_right) + df["sensor_r"]
+    
+    #Generate an empty list for traces
+    trace_list = []
+    #Generate TraceData object and append it
+    trace_list.append(TraceData("z0", x_data=np.zeros(n), y_data=y_vals, z_data=np.full(n, 0), color="grey", dash='dot'))
+    trace_list.append(TraceData("LeftZero", x_data=np.zeros(n), y_data=y_vals, z_data=z_left_zero, color="black", dash='dot'))
+    trace_list.append(TraceData("Left", x_data=np.full(n, x_left), y_data=y_vals, z_data=df["sensor_l"], color="black"))
+    trace_list.append(TraceData("Middle", x_data=np.full(n, x_mid), y_data=y_vals, z_data=df["sensor_m"], color="red"))
+    trace_list.append(TraceData("Right", x_data=np.full(n, x_right), y_data=y_vals, z_data=df["sensor_r"], color="blue"))
+    trace_list.append(TraceData("RightZero", x_data=np.full(n, 367), y_data=y_vals, z_data=z_right_zero, color="blue", dash='dot'))
+    trace_list.append(TraceData("z1", x_data=np.full(n, 367), y_data=y_vals,  z_data= np.full(n, 0), color="gray", dash='dot'))
+
+    return Traces3DPlot(trace_list)
+
 # Function to trim the dataframe and keep only the part inside the "box"
 def take_data_inside_the_box(df):
     df = df[(df["sensor_m"] < 680) & (df["sensor_m"] > 350)] 
@@ -0,0 +1,62 @@
+"""
+Benchmark of the proportioning table calculations: chain of CaclulateDateDelta + CaclulatPercent + IsInTolerance +
+NumericDeviation against the fused CalculateProportioningMetrics. Checks that both give the same DataFrame.
+
+Run from the project root:
+    python -m benchmarks.calculation_benchmark
+"""
+import time
+import numpy as np
+import pandas as pd
+from backend.classes.calculation import CaclulateDateDelta, CaclulatPercent, IsInTolerance, NumericDeviation, CalculateProportioningMetrics
+
+SIZES = (10_000, 100_000)
+REPEATS = 3
+
+def make_data(rows: int, seed: int = 0) -> pd.DataFrame:
+    # Synthetic proportionings with the special cases of the real tables (fill the box, running, NaN, durations around 60 s)
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp("2025-01-01") + pd.to_timedelta(np.arange(rows) * 600, unit="s")
+    duration = pd.to_timedelta(np.round(rng.uniform(-1, 400, rows), 6), unit="s")
+    requested = np.round(rng.uniform(0.5, 20, rows), 3)
+    requested[rng.random(rows) < 0.02] = -1 # Fill the box
+    actual = np.round(np.abs(requested) * rng.normal(1, 0.03, rows), 3)
+    actual[rng.random(rows) < 0.01] = np.nan
+
+    data = pd.DataFrame({
+        "ProportioningDBID": np.arange(rows, 0, -1),
+        "Requested": requested,
+        "Actual": actual,
+        "StartTime": start,
+        "EndTime": start + duration,
+        "Tolerance": rng.choice([1.0, 2.0, 5.0], rows),
+    })
+    data.loc[rng.random(rows) < 0.01, "EndTime"] = pd.NaT # Running proportionings
+    return data
+
+def chained(data: pd.DataFrame) -> pd.DataFrame:
+    data = CaclulateDateDelta(data, "StartTime", "EndTime", overwrite=True).apply_calculation()
+    data = CaclulatPercent(data, "Requested", "Tolerance", overwrite=False).apply_calculation()
+    data = IsInTolerance(data, "Requested", "Actual", "Tolerance").apply_calculation()
+    return NumericDeviation(data, "Requested", "Actual").apply_calculation()
+
+def fused(data: pd.DataFrame) -> pd.DataFrame:
+    return CalculateProportioningMetrics(data, "StartTime", "EndTime", "Requested", "Actual", "Tolerance").apply_calculation()
+
+def best_time(function, data: pd.DataFrame) -> float:
+    times = []
+    for _ in range(REPEATS):
+        copy = data.copy()
+        start = time.perf_counter()
+        function(copy)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == "__main__":
+    for rows in SIZES:
+        data = make_data(rows)
+        pd.testing.assert_frame_equal(chained(data.copy()), fused(data.copy())) # Same result
+
+        chained_time = best_time(chained, data)
+        fused_time = best_time(fused, data)
+        print(f"{rows:>7} rows | chained: {chained_time * 1000:8.1f} ms | fused: {fused_time * 1000:8.1f} ms | x{chained_time / fused_time:.1f}")
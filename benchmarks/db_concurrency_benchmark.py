@@ -0,0 +1,62 @@
+"""
+Concurrency benchmark of the database fetch paths: the async engine used by DBConnection.fetch_df against the
+previous thread-offload path (asyncio.to_thread around the synchronous engine), with N requests at the same time,
+and the bulk mode (fetch_df(bulk=True), one binary array per column) used for the signal reads.
+Uses the environments of backend/database/config.py.
+
+Run from the project root:
+    python -m benchmarks.db_concurrency_benchmark --prop 12345
+    python -m benchmarks.db_concurrency_benchmark --env CONFIG --prop 12345 --query summary --concurrency 1 10 50 100
+"""
+import argparse
+import asyncio
+import time
+import numpy as np
+from backend.database.db_connections import ALL_DB_CONNECTIONS
+from backend.database.query import query_analyzer_logging, query_analyzer_summary
+
+QUERIES = {
+    "logging": query_analyzer_logging, # Large per-proportioning read (Analyzer graphs)
+    "summary": query_analyzer_summary, # Small one-row lookup (Analyzer summary table)
+}
+
+async def timed(fetch) -> float:
+    start = time.perf_counter()
+    await fetch()
+    return time.perf_counter() - start
+
+async def run(db_connection, path: str, query: str, prop: int, concurrency: int):
+    if path == "thread":
+        fetch = lambda: asyncio.to_thread(db_connection._connect_and_fetch_df, query, {"current_prop": prop})
+    elif path == "bulk":
+        fetch = lambda: db_connection.fetch_df(query, current_prop=prop, bulk=True)
+    else:
+        fetch = lambda: db_connection.fetch_df(query, current_prop=prop)
+
+    await fetch() # Warm up (connections and prepared statements)
+
+    start = time.perf_counter()
+    latencies = await asyncio.gather(*[timed(fetch) for _ in range(concurrency)])
+    wall = time.perf_counter() - start
+
+    latencies = np.array(latencies) * 1000
+    print(f"{path:>6} | {concurrency:>4} requests | wall {wall * 1000:8.1f} ms | "
+          f"p50 {np.percentile(latencies, 50):8.1f} ms | p95 {np.percentile(latencies, 95):8.1f} ms | {concurrency / wall:7.1f} req/s")
+
+async def main(args):
+    db_connection = ALL_DB_CONNECTIONS[args.env]
+    query = QUERIES[args.query]
+
+    for concurrency in args.concurrency:
+        for path in ("thread", "async", "bulk"):
+            await run(db_connection, path, query, args.prop, concurrency)
+
+    await db_connection.aclose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--env", default="CONFIG", help="Environment name (key of env_map)")
+    parser.add_argument("--prop", type=int, required=True, help="Proportioning DB id to fetch")
+    parser.add_argument("--query", choices=QUERIES, default="logging")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50, 100])
+    asyncio.run(main(parser.parse_args()))
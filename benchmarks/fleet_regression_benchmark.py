@@ -0,0 +1,55 @@
+"""
+Benchmark of the fleet-wide Regressor fits (FleetRegression): every lot fitted one after the other in the event loop
+process against the chunks of lots on the process pool. Checks that both give the same coefficients.
+
+Run from the project root:
+    python -m benchmarks.fleet_regression_benchmark
+"""
+import asyncio
+import time
+import numpy as np
+import pandas as pd
+from backend.classes.fleet_regression import FleetRegression, fit_lots
+
+LOTS = (200, 2000)
+POINTS_PER_LOT = 2000
+GRADES = (2, 10) # Widest range of the Regressor page (Amount of Regressions = 9)
+
+def make_data(lots: int, seed: int = 0):
+    # Synthetic intermediates of every lot (sorted by lot, as the bulk query) and their flow table
+    rng = np.random.default_rng(seed)
+    flow = rng.uniform(0.01, 2.0, lots * POINTS_PER_LOT)
+    intermediates = pd.DataFrame({
+        "lot_dbid": np.repeat(np.arange(1, lots + 1), POINTS_PER_LOT),
+        "flow": flow,
+        "opening": 20 + 8 * np.log10(flow) + 1.5 * np.log10(flow) ** 2 + rng.normal(0, 0.5, len(flow)),
+    })
+    table = pd.DataFrame({"lot_id": [f"LOT{lot}" for lot in range(1, lots + 1)], "lot_dbid": np.arange(1, lots + 1), "c1_in_minflow": 0.01, "c1_in_maxflow": 2.0})
+    return intermediates, table
+
+def serial(intermediates: pd.DataFrame):
+    lots = [(lot_dbid, group["flow"].to_numpy(), group["opening"].to_numpy()) for lot_dbid, group in intermediates.groupby("lot_dbid")]
+    return pd.DataFrame(fit_lots(lots, GRADES))
+
+async def main():
+    fleet = FleetRegression()
+    for lots in LOTS:
+        intermediates, table = make_data(lots)
+
+        start = time.perf_counter()
+        expected = serial(intermediates)
+        serial_time = time.perf_counter() - start
+
+        await fleet.compute(intermediates.head(POINTS_PER_LOT), table.head(1), GRADES) # Start the worker processes
+        start = time.perf_counter()
+        result = await fleet.compute(intermediates, table, GRADES)
+        pool_time = time.perf_counter() - start
+
+        for grade in range(GRADES[0], GRADES[1] + 1): # Same coefficients
+            column = f"Degree{grade}Coefficients"
+            np.testing.assert_allclose(np.vstack(result[column]), np.vstack(expected[column]), rtol=1e-9, atol=1e-9)
+        print(f"{lots:>5} lots x {POINTS_PER_LOT} points | serial {serial_time:6.2f} s | process pool ({fleet.max_workers} workers) {pool_time:6.2f} s | x{serial_time / pool_time:5.1f}")
+    fleet.executor.shutdown()
+
+if __name__ == "__main__":
+    asyncio.run(main())
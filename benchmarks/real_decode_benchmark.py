@@ -0,0 +1,48 @@
+"""
+Benchmark of the conversion of real (float32) columns in the bulk reads (DBConnection._real_to_float64): the row path
+gets the float64 of the text PostgreSQL sends ("20.019608"), the bulk path gets float32 values. Compares the
+vectorized shortest round trip search against the plain conversion through text (values.astype(str)), on all-unique
+signals (worst case) and on signals that repeat values (as the logging signals do). Checks that both give the same
+float64 values, and the size of the JSON against the widened float32 values (what the bulk read would send without it).
+
+Run from the project root:
+    python -m benchmarks.real_decode_benchmark
+"""
+import json
+import time
+import numpy as np
+from backend.classes.db_connection import DBConnection
+
+ROWS = 20_000 # Logging rows of a long dosing
+REPEATS = 5
+
+def make_signal(unique: bool, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    signal = rng.uniform(0, 120, ROWS)
+    if not unique:
+        signal = np.round(signal, 1) # Slide positions/weights repeat values at the sensor resolution
+    return signal.astype(np.float32)
+
+def through_text(values: np.ndarray) -> np.ndarray:
+    return values.astype(str).astype(np.float64)
+
+def best_time(function, values) -> float:
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(values)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == "__main__":
+    for unique in (True, False):
+        values = make_signal(unique)
+        expected, result = through_text(values), DBConnection._real_to_float64(values)
+        np.testing.assert_array_equal(result, expected) # Same values as the row path
+
+        text_time = best_time(through_text, values)
+        search_time = best_time(DBConnection._real_to_float64, values)
+        json_size = len(json.dumps(result.tolist()))
+        widened_size = len(json.dumps(values.astype(np.float64).tolist()))
+        print(f"{'unique' if unique else 'repeated':>8} values | astype(str) {text_time * 1000:7.2f} ms | shortest round trip search {search_time * 1000:7.2f} ms | "
+              f"x{text_time / search_time:5.1f} | JSON {json_size / 1024:6.0f} KiB (widened float32: {widened_size / 1024:6.0f} KiB)")
@@ -0,0 +1,46 @@
+"""
+Benchmark of the Regressor graph fits: one np.polyfit per grade (previous CalculateLogTraces) against the single QR
+factorization of LeastSquaresPolynomial. Checks that both give the same coefficients.
+
+Run from the project root:
+    python -m benchmarks.regression_benchmark
+"""
+import time
+import numpy as np
+from backend.classes.regression import LeastSquaresPolynomial
+
+SIZES = (400, 10_000, 100_000)
+GRADES = (2, 10) # Widest range of the Regressor page (Amount of Regressions = 9)
+REPEATS = 5
+
+def make_data(points: int, seed: int = 0):
+    # Synthetic intermediates: log10(flow) against the slide opening, with noise
+    rng = np.random.default_rng(seed)
+    flow = rng.uniform(0.01, 2.0, points)
+    opening = 20 + 8 * np.log10(flow) + 1.5 * np.log10(flow) ** 2 + rng.normal(0, 0.5, points)
+    return np.log10(flow), opening
+
+def polyfit_per_grade(x, y):
+    return {grade: np.polyfit(x, y, grade) for grade in range(GRADES[0], GRADES[1] + 1)}
+
+def single_qr(x, y):
+    return LeastSquaresPolynomial(x, y, GRADES[1]).fit_degrees(range(GRADES[0], GRADES[1] + 1))
+
+def best_time(function, x, y) -> float:
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(x, y)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+if __name__ == "__main__":
+    for points in SIZES:
+        x, y = make_data(points)
+        expected, result = polyfit_per_grade(x, y), single_qr(x, y)
+        for grade in expected: # Same curves
+            np.testing.assert_allclose(np.polyval(result[grade], x), np.polyval(expected[grade], x), rtol=1e-9, atol=1e-9)
+
+        polyfit_time = best_time(polyfit_per_grade, x, y)
+        qr_time = best_time(single_qr, x, y)
+        print(f"{points:>7} points | polyfit per grade {polyfit_time * 1000:8.2f} ms | single QR {qr_time * 1000:8.2f} ms | x{polyfit_time / qr_time:5.1f}")
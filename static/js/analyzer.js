@@ -3,77 +3,10 @@ const uid = ensureUID();
 
 // -------------------- UPDATE ANALYZER DATA -------------------- //
 window.addEventListener("DOMContentLoaded", () => {
-    // Fetch and inject Graph1 HTML
-    fetch("/analyzer/Graph1", { })
-    .then(res => res.text())
-    .then(html => {
-        const graphContainer = document.getElementById("graph-container");
-        graphContainer.innerHTML = html;  // 1) insert raw HTML
-
-        // 2) now find all <script> tags inside the graphContainer
-        graphContainer.querySelectorAll("script").forEach(oldScript => {
-            // Create a new identical <script>
-            const newScript = document.createElement("script");
-            if (oldScript.src) {
-                newScript.src = oldScript.src;
-            } else {
-                newScript.textContent = oldScript.textContent;
-            }
-            // Add it to <head> (or body)
-            document.head.appendChild(newScript);
-            // Optionally remove the old one
-            oldScript.remove();
-        });
-    })
-    .catch(err => console.error("Error fetching graph:", err));
-
-    // Fetch and inject Graph2 HTML
-    fetch("/analyzer/Graph2", { })
-    .then(res => res.text())
-    .then(html => {
-        const graphContainer = document.getElementById("graph-container2");
-        graphContainer.innerHTML = html;  // 1) insert raw HTML
-
-        // 2) now find all <script> tags inside the graphContainer
-        graphContainer.querySelectorAll("script").forEach(oldScript => {
-            // Create a new identical <script>
-            const newScript = document.createElement("script");
-            if (oldScript.src) {
-                newScript.src = oldScript.src;
-            } else {
-                newScript.textContent = oldScript.textContent;
-            }
-            // Add it to <head> (or body)
-            document.head.appendChild(newScript);
-            // Optionally remove the old one
-            oldScript.remove();
-        });
-    })
-    .catch(err => console.error("Error fetching graph:", err));
-
-    // Fetch and inject Graph2 HTML
-    fetch("/analyzer/Graph3", { })
-    .then(res => res.text())
-    .then(html => {
-        const graphContainer = document.getElementById("graph-container3");
-        graphContainer.innerHTML = html;  // 1) insert raw HTML
-
-        // 2) now find all <script> tags inside the graphContainer
-        graphContainer.querySelectorAll("script").forEach(oldScript => {
-            // Create a new identical <script>
-            const newScript = document.createElement("script");
-            if (oldScript.src) {
-                newScript.src = oldScript.src;
-            } else {
-                newScript.textContent = oldScript.textContent;
-            }
-            // Add it to <head> (or body)
-            document.head.appendChild(newScript);
-            // Optionally remove the old one
-            oldScript.remove();
-        });
-    })
-    .catch(err => console.error("Error fetching graph:", err));
+    // Fetch and draw the graphs
+    renderFigure("/analyzer/Graph1Figure", "graph-container");
+    renderFigure("/analyzer/Graph2Figure", "graph-container2");
+    renderFigure("/analyzer/Graph3Figure", "graph-container3");
 
     // Fetch current Proportioning ID
     fetch("/common/PropId")
@@ -143,6 +76,22 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 });
 
+// Fetch a graph as Plotly figure JSON and draw it (plotly.js is loaded once by the page)
+function renderFigure(link, containerId) {
+    fetch(link)
+        .then(res => res.json())
+        .then(figure => {
+            if (figure.error) {
+                throw new Error(figure.error);
+            }
+            Plotly.react(containerId, figure.data, figure.layout, { responsive: true });
+        })
+        .catch(err => {
+            console.error("Error fetching graph:", err);
+            document.getElementById(containerId).innerHTML = `<p>${err.message}</p>`;
+        });
+}
+
 // Function to fetch proportioning data
 function fetchSummaryData(link) {
     fetch(link) // Adjust the URL
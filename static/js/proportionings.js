@@ -4,6 +4,10 @@ const uid = ensureUID();
 let fullData = [];
 let currentPage = 1;
 const rowsPerPage = 500;
+let currentLink = null; // Endpoint (with filters) of the loaded rows
+let nextBeforeDbId = null; // Cursor for the next page (null = no more rows)
+let latestDbId = null; // Newest proportioning of the loaded rows (delta refresh)
+let lastRevision = null; // Revision of the loaded rows (from the first page, then from every delta refresh)
 let sortDirections = []; // Track sort direction per column (true = ascending)
 
 const columnKeys = [
@@ -87,7 +91,12 @@ document.addEventListener("DOMContentLoaded", function () {
 
     addButtonEventListener("#updateButton", () => {
         console.log("Update Table Data...");
-        fetchProportioningData("/api/proportionings");
+        // Unfiltered table already loaded: only fetch the new/changed rows
+        if (currentLink === "/api/proportionings" && latestDbId !== null) {
+            refreshProportioningData();
+        } else {
+            fetchProportioningData("/api/proportionings");
+        }
     });
 
     addButtonEventListener("#FilterButton", () => {
@@ -120,18 +129,81 @@ document.addEventListener("DOMContentLoaded", function () {
 });
 
 // ---------------- FETCH + PAGINATION ---------------- //
+// Build the url of one page (keyset pagination: rows older than beforeDbId)
+function pageUrl(link, beforeDbId) {
+    const separator = link.includes("?") ? "&" : "?";
+    let url = `${link}${separator}page_size=${rowsPerPage}`;
+    if (beforeDbId !== null) url += `&before_dbid=${beforeDbId}`;
+    return url;
+}
+
 function fetchProportioningData(link) {
     console.time("RenderTableFetch");
-    fetch(link)
+    fetch(pageUrl(link, null))
         .then(response => response.json())
         .then(data => {
-            fullData = data;
+            if (data.error) throw new Error(data.error); // Keep the table that is shown
+
+            currentLink = link;
+            fullData = data.rows;
+            nextBeforeDbId = data.next_before_dbid;
+            latestDbId = fullData.length > 0 ? fullData[0].ProportioningDBID : null;
+            lastRevision = data.revision !== undefined ? data.revision : null; // The first refresh sends every row changed after this load
             currentPage = 1;
             renderTablePage(currentPage);
             renderPaginationControls();
-            console.timeEnd("RenderTableFetch");
         })
-        .catch(error => console.error("Error fetching data:", error));
+        .catch(error => console.error("Error fetching data:", error))
+        .finally(() => console.timeEnd("RenderTableFetch"));
+}
+
+// Fetch the next page from the backend and append it to the loaded rows
+function fetchNextPage() {
+    if (currentLink === null || nextBeforeDbId === null) return;
+
+    fetch(pageUrl(currentLink, nextBeforeDbId))
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) throw new Error(data.error);
+
+            fullData = fullData.concat(data.rows);
+            nextBeforeDbId = data.next_before_dbid;
+            currentPage = Math.max(1, Math.ceil(fullData.length / rowsPerPage));
+            renderTablePage(currentPage);
+            renderPaginationControls();
+        })
+        .catch(error => console.error("Error fetching next page:", error));
+}
+
+// Fetch only the proportionings newer than the loaded ones plus the changed ones, and merge them into the table
+function refreshProportioningData() {
+    let url = `/api/proportionings?since_dbid=${latestDbId}`;
+    if (lastRevision !== null) url += `&since_revision=${lastRevision}`;
+
+    fetch(url)
+        .then(response => response.json())
+        .then(data => {
+            if (data.error) throw new Error(data.error);
+
+            if (data.full) {
+                // Too far behind the server cache: replace the table
+                fullData = data.rows;
+                nextBeforeDbId = fullData.length > 0 ? fullData[fullData.length - 1].ProportioningDBID : null;
+                currentPage = 1;
+            } else {
+                const updated = new Map(data.rows.map(row => [row.ProportioningDBID, row]));
+                fullData = fullData.map(row => updated.get(row.ProportioningDBID) || row);
+                const known = new Set(fullData.map(row => row.ProportioningDBID));
+                const newRows = data.rows.filter(row => !known.has(row.ProportioningDBID) && row.ProportioningDBID > latestDbId); // Changed rows older than the loaded ones are not shown yet
+                fullData = newRows.concat(fullData);
+            }
+
+            latestDbId = Math.max(latestDbId, data.latest_dbid);
+            lastRevision = data.revision;
+            renderTablePage(currentPage);
+            renderPaginationControls();
+        })
+        .catch(error => console.error("Error refreshing data:", error));
 }
 
 function renderTablePage(page) {
@@ -226,6 +298,15 @@ function renderPaginationControls() {
 
         container.appendChild(btn);
     }
+
+    // More rows in the database: load them on demand
+    if (nextBeforeDbId !== null) {
+        const moreBtn = document.createElement("button");
+        moreBtn.textContent = "Load more";
+        moreBtn.classList.add("pagination-button");
+        moreBtn.addEventListener("click", fetchNextPage);
+        container.appendChild(moreBtn);
+    }
 }
 // ---------------- Pop Up Fuction ---------------- //
 
@@ -263,4 +344,4 @@ function showPopupMessage(message, isError = false) {
             popupOffset -= 60; // Liberar espacio cuando desaparece
         });
     }, 2000);
-}
\ No newline at end of file
+}
\ No newline at end of file
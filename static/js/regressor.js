@@ -26,24 +26,8 @@ document.addEventListener("DOMContentLoaded", function () {
     })
     .catch(error => console.error("Error fetching current propDbId:", error));
 
-    // Fetch and inject Graph HTML
-    fetch("/regressor/Graph")
-        .then(res => res.text())
-        .then(html => {
-            const graphContainer = document.getElementById("regressor_graph_container");
-            graphContainer.innerHTML = html;
-
-            graphContainer.querySelectorAll("script").forEach(oldScript => {
-                const newScript = document.createElement("script");
-                if (oldScript.src) {
-                    newScript.src = oldScript.src;
-                } else {
-                    newScript.textContent = oldScript.textContent;
-                }
-                document.head.appendChild(newScript);
-                oldScript.remove();
-            });
-        });
+    // Fetch and draw the Graph
+    renderFigure("/regressor/GraphFigure", "regressor_graph_container");
 
     fetchSummaryData("/regressor/SummaryTable");
 
@@ -59,26 +43,9 @@ document.addEventListener("DOMContentLoaded", function () {
                 const intermediates = intermediatesInput.value;
                 const amountOfRegressions = regressionsInput.value;
 
-                const url = `/regressor/Graph?intermediates=${intermediates}&amountOfRegressions=${amountOfRegressions}`;
-
-                fetch(url)
-                    .then(res => res.text())
-                    .then(html => {
-                        const graphContainer = document.getElementById("regressor_graph_container");
-                        graphContainer.innerHTML = html;
-
-                        graphContainer.querySelectorAll("script").forEach(oldScript => {
-                            const newScript = document.createElement("script");
-                            if (oldScript.src) {
-                                newScript.src = oldScript.src;
-                            } else {
-                                newScript.textContent = oldScript.textContent;
-                            }
-                            document.head.appendChild(newScript);
-                            oldScript.remove();
-                        });
-                    })
-                    .catch(err => console.error("Error updating regressor graph:", err));
+                const url = `/regressor/GraphFigure?intermediates=${intermediates}&amountOfRegressions=${amountOfRegressions}`;
+
+                renderFigure(url, "regressor_graph_container");
             } else {
                 console.warn("One or both sliders are missing.");
             }
@@ -86,6 +53,22 @@ document.addEventListener("DOMContentLoaded", function () {
     }
 });
 
+// Fetch a graph as Plotly figure JSON and draw it (plotly.js is loaded once by the page)
+function renderFigure(link, containerId) {
+    fetch(link)
+        .then(res => res.json())
+        .then(figure => {
+            if (figure.error) {
+                throw new Error(figure.error);
+            }
+            Plotly.react(containerId, figure.data, figure.layout, { responsive: true });
+        })
+        .catch(err => {
+            console.error("Error fetching graph:", err);
+            document.getElementById(containerId).innerHTML = `<p>${err.message}</p>`;
+        });
+}
+
 // Function to fetch proportioning data
 function fetchSummaryData(link) {
     fetch(link) // Adjust the URL
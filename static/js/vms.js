@@ -26,28 +26,28 @@ document.addEventListener("DOMContentLoaded", function () {
     })
     .catch(error => console.error("Error fetching current propDbId:", error));
 
-    // Fetch and inject Graph HTML
-    fetch("/vms/Graph")
-        .then(res => res.text())
-        .then(html => {
-            const graphContainer = document.getElementById("VMS_graph_container");
-            graphContainer.innerHTML = html;
-
-            graphContainer.querySelectorAll("script").forEach(oldScript => {
-                const newScript = document.createElement("script");
-                if (oldScript.src) {
-                    newScript.src = oldScript.src;
-                } else {
-                    newScript.textContent = oldScript.textContent;
-                }
-                document.head.appendChild(newScript);
-                oldScript.remove();
-            });
-        });
+    // Fetch and draw the Graph
+    renderFigure("/vms/GraphFigure", "VMS_graph_container");
     
     fetchSummaryData("/vms/Summary");
 });
 
+// Fetch a graph as Plotly figure JSON and draw it (plotly.js is loaded once by the page)
+function renderFigure(link, containerId) {
+    fetch(link)
+        .then(res => res.json())
+        .then(figure => {
+            if (figure.error) {
+                throw new Error(figure.error);
+            }
+            Plotly.react(containerId, figure.data, figure.layout, { responsive: true });
+        })
+        .catch(err => {
+            console.error("Error fetching graph:", err);
+            document.getElementById(containerId).innerHTML = `<p>${err.message}</p>`;
+        });
+}
+
 // Function to fetch proportioning data
 function fetchSummaryData(link) {
     fetch(link) // Adjust the URL
@@ -0,0 +1,13 @@
+import sys
+import types
+
+# backend/database/config.py is local to every installation (not in the repository): the tests don't connect to a
+# database, they only need one environment defined.
+try:
+    import backend.database.config # noqa: F401
+except ImportError:
+    config = {"ConnectionStrings": {"UserID": "test", "Password": "", "Server": "localhost", "Port": 5432, "Database": "test"}}
+    module = types.ModuleType("backend.database.config")
+    module.config = config
+    module.env_map = {"CONFIG": config}
+    sys.modules["backend.database.config"] = module
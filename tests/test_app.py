@@ -0,0 +1,14 @@
+import plotly
+from fastapi.testclient import TestClient
+from app import app
+
+def test_plotly_js_cached_under_its_version():
+    client = TestClient(app)
+
+    latest = client.get("/static/js/plotly.min.js", follow_redirects=False)
+    assert latest.headers["location"] == f"/static/js/plotly-{plotly.__version__}.min.js"
+    assert latest.headers["cache-control"] == "no-cache"
+
+    bundle = client.get(latest.headers["location"])
+    assert bundle.status_code == 200
+    assert "max-age=31536000" in bundle.headers["cache-control"]
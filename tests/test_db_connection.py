@@ -0,0 +1,24 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import pandas as pd
+from backend.classes.db_connection import DBConnection
+
+def test_frame_from_rows_timestamptz_in_utc():
+    # psycopg returns timestamptz values in the session time zone, pd.read_sql gave them in UTC
+    madrid = ZoneInfo("Europe/Madrid")
+    rows = [(1, datetime(2024, 3, 31, 1, 30, tzinfo=madrid), datetime(2024, 1, 1, 10)),
+            (2, datetime(2024, 3, 31, 4, 30, tzinfo=madrid), None)]
+
+    df = DBConnection._frame_from_rows(rows, ["id", "StartTime", "Naive"])
+
+    assert str(df["StartTime"].dtype) == "datetime64[ns, UTC]"
+    assert df["StartTime"].tolist() == [pd.Timestamp("2024-03-31 00:30", tz="UTC"), pd.Timestamp("2024-03-31 02:30", tz="UTC")]
+    assert df["Naive"].dtype.kind == "M" # Timestamps without time zone are kept as they are
+
+def test_frame_from_rows_repeated_column_names():
+    rows = [(datetime(2024, 1, 1, 12, tzinfo=ZoneInfo("Europe/Madrid")), 1)]
+
+    df = DBConnection._frame_from_rows(rows, ["time", "time"])
+
+    assert str(df.iloc[:, 0].dtype) == "datetime64[ns, UTC]"
+    assert df.iloc[0, 1] == 1
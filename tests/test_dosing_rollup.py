@@ -0,0 +1,21 @@
+from datetime import date
+from zoneinfo import ZoneInfo
+import pandas as pd
+from backend.classes.dosing_rollup import DosingRollup
+
+def finished_proportionings(start_times) -> pd.DataFrame:
+    return pd.DataFrame({
+        "ArticleDBID": 1, "ArticleName": "Salt", "DosingLocation": 1, "TypeOfDosing": 1,
+        "StartTime": pd.to_datetime(start_times, utc=True), # timestamptz, as read from the database
+        "Requested": 10.0, "Actual": 10.0, "Tolerance": 5.0,
+    })
+
+def test_kpis_date_filter_on_plant_days():
+    rollup = DosingRollup(timezone=ZoneInfo("Europe/Madrid"))
+    rollup.update(finished_proportionings(["2025-01-21 10:00", "2025-01-21 23:30", "2025-01-22 12:00"])) # 23:30 UTC is already the 22nd in Madrid
+
+    by_day = rollup.kpis(["Day"], date_from=date(2025, 1, 21), date_to=date(2025, 1, 22))
+    assert by_day[["Day", "Count"]].to_dict("records") == [{"Day": date(2025, 1, 21), "Count": 1}, {"Day": date(2025, 1, 22), "Count": 2}]
+
+    assert rollup.kpis([], date_from=date(2025, 1, 22))["Count"].tolist() == [2]
+    assert rollup.kpis([], date_to=date(2025, 1, 21))["Count"].tolist() == [1]
@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.classes.proportioning_cache import ProportioningCache
+from backend.classes.request import RequestEnvironment
+from backend.routes import proportionings
+
+class FakeConnection:
+    """
+    Proportionings table in memory, answering the WHERE clauses of the proportionings route (keyset page, delta).
+    """
+    name = "CONFIG"
+
+    def __init__(self, table: pd.DataFrame):
+        self.table = table
+        self.limits = [] # LIMIT (rows) of every query
+
+    async def fetch_df(self, query: str, rows: int, before_dbid=None, since_dbid=None, pending=None, **params) -> pd.DataFrame:
+        self.limits.append(rows)
+        dbids = self.table["ProportioningDBID"]
+        selected = pd.Series(True, index=self.table.index)
+        if before_dbid is not None:
+            selected &= dbids < before_dbid
+        if since_dbid is not None:
+            selected &= (dbids > since_dbid) | dbids.isin(pending)
+        return self.table[selected].sort_values("ProportioningDBID", ascending=False).head(rows).reset_index(drop=True)
+
+def proportionings_client(monkeypatch, connection: FakeConnection) -> TestClient:
+    monkeypatch.setattr(RequestEnvironment, "ConnectToUserEnvironment", lambda self: connection)
+    monkeypatch.setattr(proportionings, "format_proportionings", lambda data: data.assign(EndTime=data["EndTime"].notna()))
+    monkeypatch.setitem(proportionings.proportioning_caches, connection.name, ProportioningCache(max_rows=100))
+    app = FastAPI()
+    app.include_router(proportionings.router)
+    return TestClient(app)
+
+def finished(response, dbid: int) -> bool:
+    return {row["ProportioningDBID"]: row["EndTime"] for row in response.json()["rows"]}[dbid]
+
+@pytest.mark.parametrize("other_client_refreshed", [False, True])
+def test_first_refresh_sends_rows_finished_after_the_page_load(monkeypatch, other_client_refreshed):
+    connection = FakeConnection(pd.DataFrame({"ProportioningDBID": [1, 2, 3], "EndTime": [pd.Timestamp("2025-01-21 19:20"), pd.Timestamp("2025-01-21 19:21"), pd.NaT]}))
+    client = proportionings_client(monkeypatch, connection)
+
+    page = client.get("/api/proportionings?page_size=500")
+    assert not finished(page, 3)
+
+    connection.table.loc[2, "EndTime"] = pd.Timestamp("2025-01-21 19:22") # Proportioning 3 finishes
+    if other_client_refreshed:
+        client.get("/api/proportionings?since_dbid=3") # 3 is no longer pending in the cache
+
+    refresh = client.get(f"/api/proportionings?since_dbid=3&since_revision={page.json()['revision']}")
+
+    assert refresh.json()["full"] is False
+    assert finished(refresh, 3)
+
+def test_filtered_table_limited_in_the_query(monkeypatch):
+    connection = FakeConnection(pd.DataFrame({"ProportioningDBID": range(1, 801), "EndTime": pd.Timestamp("2025-01-21 19:20")}))
+    client = proportionings_client(monkeypatch, connection)
+    monkeypatch.setattr(proportionings, "calculate", lambda data: data)
+    monkeypatch.setattr(proportionings, "make_db_redable", lambda data: data)
+
+    response = client.get("/api/proportioningsfilter?ageSwitchChecked=true&timeUnit=Days&rangeValue=7") # Default "rows": 1000
+
+    assert connection.limits == [500]
+    assert len(response.json()) == 500
@@ -0,0 +1,39 @@
+import pandas as pd
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from backend.classes.request import RequestEnvironment, RequestLotId
+from backend.routes import regressor
+
+class FakeConnection:
+    name = "CONFIG"
+
+    def __init__(self, summary: pd.DataFrame):
+        self.summary = summary
+
+    async def fetch_df_shared(self, query: str, current_prop=None, current_lot=None, **params) -> pd.DataFrame:
+        return self.summary.copy(deep=False)
+
+def summary_client(monkeypatch, summary: pd.DataFrame) -> TestClient:
+    async def lot_id(self):
+        return 7
+
+    monkeypatch.setattr(RequestEnvironment, "ConnectToUserEnvironment", lambda self: FakeConnection(summary))
+    monkeypatch.setattr(RequestLotId, "return_data", lot_id)
+    app = FastAPI()
+    app.include_router(regressor.router)
+    return TestClient(app)
+
+def test_summary_table_lot_without_rows(monkeypatch):
+    empty = pd.DataFrame(columns=["lot_id", "lot_dbid", "c1_in_minflow", "c1_in_maxflow", "IntermediateCount"])
+
+    response = summary_client(monkeypatch, empty).get("/regressor/SummaryTable")
+
+    assert response.status_code == 200
+    assert response.json() == []
+
+def test_summary_table_intermediate_count(monkeypatch):
+    summary = pd.DataFrame({"lot_id": ["LOT7"], "lot_dbid": [7], "c1_in_minflow": [0.01], "c1_in_maxflow": [2.0], "IntermediateCount": [425]})
+
+    response = summary_client(monkeypatch, summary).get("/regressor/SummaryTable")
+
+    assert response.json() == [{"lot_id": "LOT7", "lot_dbid": 7, "c1_in_minflow": 0.01, "c1_in_maxflow": 2.0, "IntermediateCount": "425"}]
@@ -0,0 +1,54 @@
+import asyncio
+from types import SimpleNamespace
+from backend.classes import request
+from backend.classes.request import UserInfo, RequestLotId
+from backend.memory.state import session_data
+from backend.routes.proportionings import handle_row_click
+
+def lot_id(uid: str) -> RequestLotId:
+    return RequestLotId(SimpleNamespace(cookies={"uid": uid}))
+
+LOTS = {101: {"lot_dbid": 1, "article_dbid": 11}, 202: {"lot_dbid": 2, "article_dbid": 22}}
+
+def test_overlapping_row_clicks_keep_the_keys_of_the_last_click(monkeypatch):
+    async def scenario():
+        first_lookup = asyncio.Event()
+        lookups = []
+
+        async def resolve(db_connection, current_prop):
+            lookups.append(current_prop)
+            if current_prop == 101:
+                await first_lookup.wait() # Answers after the second click
+            return LOTS[current_prop]
+
+        monkeypatch.setattr(request.proportioning_keys, "resolve", resolve)
+        session_data["race"] = {"environment": "CONFIG"}
+
+        first = asyncio.create_task(handle_row_click(UserInfo(uid="race", propDbId=101)))
+        await asyncio.sleep(0)
+        await handle_row_click(UserInfo(uid="race", propDbId=202))
+        first_lookup.set()
+        await first
+
+        assert session_data["race"]["current_prop_id"] == 202
+        assert session_data["race"]["proportioning_keys"]["lot_dbid"] == 2
+        assert await lot_id("race").return_data() == 2
+        assert lookups == [101, 202]
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        session_data.pop("race", None)
+
+def test_lot_id_resolved_again_for_keys_of_another_proportioning(monkeypatch):
+    async def resolve(db_connection, current_prop):
+        return LOTS[current_prop]
+
+    monkeypatch.setattr(request.proportioning_keys, "resolve", resolve)
+    session_data["stale"] = {"environment": "CONFIG", "current_prop_id": 202,
+                             "proportioning_keys": {"proportioning_dbid": 101, "environment": "CONFIG", **LOTS[101]}}
+    try:
+        assert asyncio.run(lot_id("stale").return_data()) == 2
+        assert session_data["stale"]["proportioning_keys"]["proportioning_dbid"] == 202
+    finally:
+        session_data.pop("stale", None)
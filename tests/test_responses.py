@@ -0,0 +1,62 @@
+import asyncio
+import json
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+import pandas as pd
+import pytest
+from backend.classes.responses import DataFrameJSONResponse, ColumnarJSONResponse, ndjson_response
+
+def test_records_json_round_trips_floats():
+    # Tiny and non terminating values must not be cut to a number of decimals
+    df = pd.DataFrame({
+        "ProportioningDBID": [1, 2, 3],
+        "Deviation": [1 / 3, 3.33e-12, -2 / 7],
+        "Actual": [1234.5678901234567, 1e-300, 0.1 + 0.2],
+        "ArticleName": ["Salt", "Sugar", None],
+    })
+
+    assert DataFrameJSONResponse.frame_json(df) == json.dumps(df.to_dict("records"), separators=(",", ":"))
+    assert json.loads(DataFrameJSONResponse.frame_json(df))[1]["Deviation"] == 3.33e-12
+
+def test_records_json_missing_values_as_null():
+    df = pd.DataFrame({"Value": [np.nan, np.inf, 1.5], "Count": pd.array([1, None, 3], dtype="Int64")})
+
+    assert json.loads(DataFrameJSONResponse.frame_json(df)) == [{"Value": None, "Count": 1}, {"Value": None, "Count": None}, {"Value": 1.5, "Count": 3}]
+
+def test_columns_json_round_trips_floats():
+    df = pd.DataFrame({"Deviation": [1 / 3, 3.33e-12]})
+
+    content = json.loads(ColumnarJSONResponse.frame_json(df))
+
+    assert content["columns"] == [[1 / 3, 3.33e-12]]
+
+def test_columns_json_time_zone_column():
+    # psycopg returns timestamptz values with zoneinfo.ZoneInfo time zones (pandas' build_table_schema expects pytz)
+    madrid = ZoneInfo("Europe/Madrid")
+    df = pd.DataFrame({"ProportioningDBID": [1, 2], "StartTime": [datetime(2024, 7, 1, 12, tzinfo=madrid), None]})
+
+    content = json.loads(ColumnarJSONResponse.frame_json(df))
+
+    assert content["schema"][1] == {"name": "StartTime", "type": "datetime", "tz": "Europe/Madrid"}
+    assert content["columns"][1] == ["2024-07-01T12:00:00+02:00", None]
+
+def test_ndjson_closes_the_chunks_when_the_first_chunk_fails():
+    closed = []
+
+    async def chunks():
+        try:
+            yield pd.DataFrame({"Value": [1.0]})
+            yield pd.DataFrame({"Value": [2.0]})
+        finally:
+            closed.append(True) # stream_df gives its connection back here
+
+    def transform(chunk: pd.DataFrame) -> pd.DataFrame:
+        raise ValueError("calculation failed")
+
+    async def respond():
+        with pytest.raises(ValueError):
+            await ndjson_response(chunks(), transform)
+        return list(closed) # Before the event loop finalizes the generator
+
+    assert asyncio.run(respond()) == [True]